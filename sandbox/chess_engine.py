@@ -6,7 +6,8 @@ avaliação básica, busca minimax com alpha-beta e tabela de transposição. In
 Sem bibliotecas externas.
 
 Uso:
-    python chess_engine.py
+    python chess_engine.py              (tabuleiro em array de 64 casas)
+    python chess_engine.py --bitboard   (backend de bitboards)
 
 Controles:
     - No prompt, insira uma jogada em notação simples do tipo e2e4, g1f3, e7e8q (promoção para dama com sufixo q/r/b/n).
@@ -14,20 +15,45 @@ Controles:
     - 'quit' sai.
 """
 
+import os
 import time
+import math
+import mmap
+import struct
+import multiprocessing
+from multiprocessing import shared_memory
 import random
 import sys
+import threading
+from array import array
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 # ----------------------------
 # Representação do Tabuleiro
 # ----------------------------
 # Usamos um array de 64 casas, índice 0 = a8, 7 = h8, 56 = a1, 63 = h1 (ranks 8->1, files a->h).
-# Peças: 'P','N','B','R','Q','K' maiúsculas = brancas, minúsculas = pretas, '.' = vazio
+# Peças são inteiros pequenos: tipo nos 3 bits baixos (PAWN..KING) + bit de cor (BLACK = 8), EMPTY = 0.
+# Os caracteres 'P','N',...,'k','.' só aparecem nas bordas (FEN, impressão, Move da CLI).
 
 START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 
-Piece = str
+Piece = int
+
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE, BLACK = 0, 8
+TYPE_MASK = 7
+COLOR_BIT = {'w': WHITE, 'b': BLACK}
+PIECE_CHARS = '.PNBRQK..pnbrqk.'   # PIECE_CHARS[p] -> caractere da peça p
+PIECE_FROM_CHAR = {c: i for i, c in enumerate(PIECE_CHARS) if c != '.'}
+PIECE_FROM_CHAR['.'] = EMPTY
+# PIECE_COLOR[p] -> 'w', 'b' ou None (vazio); substitui p.isupper()/p.islower() nos laços
+PIECE_COLOR = [None] * 16
+for _p in range(1, 7):
+    PIECE_COLOR[_p] = 'w'
+    PIECE_COLOR[_p | BLACK] = 'b'
+del _p
 
 def fen_to_board(fen):
     fields = fen.split()
@@ -36,12 +62,12 @@ def fen_to_board(fen):
     for row in rows:
         for ch in row:
             if ch.isdigit():
-                board.extend('.' * int(ch))
+                board.extend([EMPTY] * int(ch))
             else:
-                board.append(ch)
+                board.append(PIECE_FROM_CHAR[ch])
     active_color = fields[1]
-    castling = fields[2]
-    enpassant = fields[3]
+    castling = castling_from_str(fields[2])
+    enpassant = sq_to_coords(fields[3]) if fields[3] != '-' else NO_SQUARE
     halfmove = int(fields[4]) if len(fields) > 4 else 0
     fullmove = int(fields[5]) if len(fields) > 5 else 1
     return board, active_color, castling, enpassant, halfmove, fullmove
@@ -53,16 +79,17 @@ def board_to_fen(board, active_color, castling, enpassant, halfmove, fullmove):
         empty = 0
         for f in range(8):
             c = board[r*8 + f]
-            if c == '.':
+            if c == EMPTY:
                 empty += 1
             else:
                 if empty:
                     row += str(empty); empty = 0
-                row += c
+                row += PIECE_CHARS[c]
         if empty: row += str(empty)
         rows.append(row)
     pos = '/'.join(rows)
-    return f"{pos} {active_color} {castling} {enpassant} {halfmove} {fullmove}"
+    ep = idx_to_sq(enpassant) if enpassant != NO_SQUARE else '-'
+    return f"{pos} {active_color} {castling_to_str(castling)} {ep} {halfmove} {fullmove}"
 
 def sq_to_coords(sq):
     # sq like "e4" -> index
@@ -75,11 +102,23 @@ def idx_to_sq(i):
     file = i % 8
     return f"{chr(ord('a')+file)}{rank}"
 
+# Direitos de roque como máscara de bits (bit i = CASTLING_CHARS[i]) e en passant como índice da casa
+# (NO_SQUARE = nenhum). As strings "KQkq"/"e3" só existem no FEN e na impressão.
+CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ = 1, 2, 4, 8
+CASTLING_CHARS = 'KQkq'
+NO_SQUARE = -1
+
+def castling_from_str(text):
+    return sum(1 << i for i, c in enumerate(CASTLING_CHARS) if c in text)
+
+def castling_to_str(mask):
+    return ''.join(c for i, c in enumerate(CASTLING_CHARS) if mask & (1 << i)) or '-'
+
 # ----------------------------
 # Helpers de peças e cores
 # ----------------------------
-WHITE_PIECES = set("PNBRQK")
-BLACK_PIECES = set("pnbrqk")
+WHITE_PIECES = set(range(PAWN, KING + 1))
+BLACK_PIECES = {p | BLACK for p in WHITE_PIECES}
 
 def is_white(p):
     return p in WHITE_PIECES
@@ -88,156 +127,571 @@ def is_black(p):
     return p in BLACK_PIECES
 
 def color_of(p):
-    if p == '.': return None
-    return 'w' if p.isupper() else 'b'
+    return PIECE_COLOR[p]
+
+# ----------------------------
+# Chaves Zobrist
+# ----------------------------
+# Compartilhadas por todos os GameState. Vetor plano indexado por peça*64 + casa (as entradas de
+# EMPTY e dos códigos sem peça ficam 0, então XOR com elas não muda nada).
+# Os números são os 781 do formato Polyglot, na mesma posição que lá, então current_zobrist já é
+# a chave de livro de aberturas a menos de duas diferenças (ver polyglot_key): o Polyglot marca
+# a vez das brancas e nós a das pretas, e ele só conta o en passant se houver peão para capturar.
+POLYGLOT_RANDOM = [
+    0x9D39247E33776D41, 0x2AF7398005AAA5C7, 0x44DB015024623547, 0x9C15F73E62A76AE2,
+    0x75834465489C0C89, 0x3290AC3A203001BF, 0x0FBBAD1F61042279, 0xE83A908FF2FB60CA,
+    0x0D7E765D58755C10, 0x1A083822CEAFE02D, 0x9605D5F0E25EC3B0, 0xD021FF5CD13A2ED5,
+    0x40BDF15D4A672E32, 0x011355146FD56395, 0x5DB4832046F3D9E5, 0x239F8B2D7FF719CC,
+    0x05D1A1AE85B49AA1, 0x679F848F6E8FC971, 0x7449BBFF801FED0B, 0x7D11CDB1C3B7ADF0,
+    0x82C7709E781EB7CC, 0xF3218F1C9510786C, 0x331478F3AF51BBE6, 0x4BB38DE5E7219443,
+    0xAA649C6EBCFD50FC, 0x8DBD98A352AFD40B, 0x87D2074B81D79217, 0x19F3C751D3E92AE1,
+    0xB4AB30F062B19ABF, 0x7B0500AC42047AC4, 0xC9452CA81A09D85D, 0x24AA6C514DA27500,
+    0x4C9F34427501B447, 0x14A68FD73C910841, 0xA71B9B83461CBD93, 0x03488B95B0F1850F,
+    0x637B2B34FF93C040, 0x09D1BC9A3DD90A94, 0x3575668334A1DD3B, 0x735E2B97A4C45A23,
+    0x18727070F1BD400B, 0x1FCBACD259BF02E7, 0xD310A7C2CE9B6555, 0xBF983FE0FE5D8244,
+    0x9F74D14F7454A824, 0x51EBDC4AB9BA3035, 0x5C82C505DB9AB0FA, 0xFCF7FE8A3430B241,
+    0x3253A729B9BA3DDE, 0x8C74C368081B3075, 0xB9BC6C87167C33E7, 0x7EF48F2B83024E20,
+    0x11D505D4C351BD7F, 0x6568FCA92C76A243, 0x4DE0B0F40F32A7B8, 0x96D693460CC37E5D,
+    0x42E240CB63689F2F, 0x6D2BDCDAE2919661, 0x42880B0236E4D951, 0x5F0F4A5898171BB6,
+    0x39F890F579F92F88, 0x93C5B5F47356388B, 0x63DC359D8D231B78, 0xEC16CA8AEA98AD76,
+    0x5355F900C2A82DC7, 0x07FB9F855A997142, 0x5093417AA8A7ED5E, 0x7BCBC38DA25A7F3C,
+    0x19FC8A768CF4B6D4, 0x637A7780DECFC0D9, 0x8249A47AEE0E41F7, 0x79AD695501E7D1E8,
+    0x14ACBAF4777D5776, 0xF145B6BECCDEA195, 0xDABF2AC8201752FC, 0x24C3C94DF9C8D3F6,
+    0xBB6E2924F03912EA, 0x0CE26C0B95C980D9, 0xA49CD132BFBF7CC4, 0xE99D662AF4243939,
+    0x27E6AD7891165C3F, 0x8535F040B9744FF1, 0x54B3F4FA5F40D873, 0x72B12C32127FED2B,
+    0xEE954D3C7B411F47, 0x9A85AC909A24EAA1, 0x70AC4CD9F04F21F5, 0xF9B89D3E99A075C2,
+    0x87B3E2B2B5C907B1, 0xA366E5B8C54F48B8, 0xAE4A9346CC3F7CF2, 0x1920C04D47267BBD,
+    0x87BF02C6B49E2AE9, 0x092237AC237F3859, 0xFF07F64EF8ED14D0, 0x8DE8DCA9F03CC54E,
+    0x9C1633264DB49C89, 0xB3F22C3D0B0B38ED, 0x390E5FB44D01144B, 0x5BFEA5B4712768E9,
+    0x1E1032911FA78984, 0x9A74ACB964E78CB3, 0x4F80F7A035DAFB04, 0x6304D09A0B3738C4,
+    0x2171E64683023A08, 0x5B9B63EB9CEFF80C, 0x506AACF489889342, 0x1881AFC9A3A701D6,
+    0x6503080440750644, 0xDFD395339CDBF4A7, 0xEF927DBCF00C20F2, 0x7B32F7D1E03680EC,
+    0xB9FD7620E7316243, 0x05A7E8A57DB91B77, 0xB5889C6E15630A75, 0x4A750A09CE9573F7,
+    0xCF464CEC899A2F8A, 0xF538639CE705B824, 0x3C79A0FF5580EF7F, 0xEDE6C87F8477609D,
+    0x799E81F05BC93F31, 0x86536B8CF3428A8C, 0x97D7374C60087B73, 0xA246637CFF328532,
+    0x043FCAE60CC0EBA0, 0x920E449535DD359E, 0x70EB093B15B290CC, 0x73A1921916591CBD,
+    0x56436C9FE1A1AA8D, 0xEFAC4B70633B8F81, 0xBB215798D45DF7AF, 0x45F20042F24F1768,
+    0x930F80F4E8EB7462, 0xFF6712FFCFD75EA1, 0xAE623FD67468AA70, 0xDD2C5BC84BC8D8FC,
+    0x7EED120D54CF2DD9, 0x22FE545401165F1C, 0xC91800E98FB99929, 0x808BD68E6AC10365,
+    0xDEC468145B7605F6, 0x1BEDE3A3AEF53302, 0x43539603D6C55602, 0xAA969B5C691CCB7A,
+    0xA87832D392EFEE56, 0x65942C7B3C7E11AE, 0xDED2D633CAD004F6, 0x21F08570F420E565,
+    0xB415938D7DA94E3C, 0x91B859E59ECB6350, 0x10CFF333E0ED804A, 0x28AED140BE0BB7DD,
+    0xC5CC1D89724FA456, 0x5648F680F11A2741, 0x2D255069F0B7DAB3, 0x9BC5A38EF729ABD4,
+    0xEF2F054308F6A2BC, 0xAF2042F5CC5C2858, 0x480412BAB7F5BE2A, 0xAEF3AF4A563DFE43,
+    0x19AFE59AE451497F, 0x52593803DFF1E840, 0xF4F076E65F2CE6F0, 0x11379625747D5AF3,
+    0xBCE5D2248682C115, 0x9DA4243DE836994F, 0x066F70B33FE09017, 0x4DC4DE189B671A1C,
+    0x51039AB7712457C3, 0xC07A3F80C31FB4B4, 0xB46EE9C5E64A6E7C, 0xB3819A42ABE61C87,
+    0x21A007933A522A20, 0x2DF16F761598AA4F, 0x763C4A1371B368FD, 0xF793C46702E086A0,
+    0xD7288E012AEB8D31, 0xDE336A2A4BC1C44B, 0x0BF692B38D079F23, 0x2C604A7A177326B3,
+    0x4850E73E03EB6064, 0xCFC447F1E53C8E1B, 0xB05CA3F564268D99, 0x9AE182C8BC9474E8,
+    0xA4FC4BD4FC5558CA, 0xE755178D58FC4E76, 0x69B97DB1A4C03DFE, 0xF9B5B7C4ACC67C96,
+    0xFC6A82D64B8655FB, 0x9C684CB6C4D24417, 0x8EC97D2917456ED0, 0x6703DF9D2924E97E,
+    0xC547F57E42A7444E, 0x78E37644E7CAD29E, 0xFE9A44E9362F05FA, 0x08BD35CC38336615,
+    0x9315E5EB3A129ACE, 0x94061B871E04DF75, 0xDF1D9F9D784BA010, 0x3BBA57B68871B59D,
+    0xD2B7ADEEDED1F73F, 0xF7A255D83BC373F8, 0xD7F4F2448C0CEB81, 0xD95BE88CD210FFA7,
+    0x336F52F8FF4728E7, 0xA74049DAC312AC71, 0xA2F61BB6E437FDB5, 0x4F2A5CB07F6A35B3,
+    0x87D380BDA5BF7859, 0x16B9F7E06C453A21, 0x7BA2484C8A0FD54E, 0xF3A678CAD9A2E38C,
+    0x39B0BF7DDE437BA2, 0xFCAF55C1BF8A4424, 0x18FCF680573FA594, 0x4C0563B89F495AC3,
+    0x40E087931A00930D, 0x8CFFA9412EB642C1, 0x68CA39053261169F, 0x7A1EE967D27579E2,
+    0x9D1D60E5076F5B6F, 0x3810E399B6F65BA2, 0x32095B6D4AB5F9B1, 0x35CAB62109DD038A,
+    0xA90B24499FCFAFB1, 0x77A225A07CC2C6BD, 0x513E5E634C70E331, 0x4361C0CA3F692F12,
+    0xD941ACA44B20A45B, 0x528F7C8602C5807B, 0x52AB92BEB9613989, 0x9D1DFA2EFC557F73,
+    0x722FF175F572C348, 0x1D1260A51107FE97, 0x7A249A57EC0C9BA2, 0x04208FE9E8F7F2D6,
+    0x5A110C6058B920A0, 0x0CD9A497658A5698, 0x56FD23C8F9715A4C, 0x284C847B9D887AAE,
+    0x04FEABFBBDB619CB, 0x742E1E651C60BA83, 0x9A9632E65904AD3C, 0x881B82A13B51B9E2,
+    0x506E6744CD974924, 0xB0183DB56FFC6A79, 0x0ED9B915C66ED37E, 0x5E11E86D5873D484,
+    0xF678647E3519AC6E, 0x1B85D488D0F20CC5, 0xDAB9FE6525D89021, 0x0D151D86ADB73615,
+    0xA865A54EDCC0F019, 0x93C42566AEF98FFB, 0x99E7AFEABE000731, 0x48CBFF086DDF285A,
+    0x7F9B6AF1EBF78BAF, 0x58627E1A149BBA21, 0x2CD16E2ABD791E33, 0xD363EFF5F0977996,
+    0x0CE2A38C344A6EED, 0x1A804AADB9CFA741, 0x907F30421D78C5DE, 0x501F65EDB3034D07,
+    0x37624AE5A48FA6E9, 0x957BAF61700CFF4E, 0x3A6C27934E31188A, 0xD49503536ABCA345,
+    0x088E049589C432E0, 0xF943AEE7FEBF21B8, 0x6C3B8E3E336139D3, 0x364F6FFA464EE52E,
+    0xD60F6DCEDC314222, 0x56963B0DCA418FC0, 0x16F50EDF91E513AF, 0xEF1955914B609F93,
+    0x565601C0364E3228, 0xECB53939887E8175, 0xBAC7A9A18531294B, 0xB344C470397BBA52,
+    0x65D34954DAF3CEBD, 0xB4B81B3FA97511E2, 0xB422061193D6F6A7, 0x071582401C38434D,
+    0x7A13F18BBEDC4FF5, 0xBC4097B116C524D2, 0x59B97885E2F2EA28, 0x99170A5DC3115544,
+    0x6F423357E7C6A9F9, 0x325928EE6E6F8794, 0xD0E4366228B03343, 0x565C31F7DE89EA27,
+    0x30F5611484119414, 0xD873DB391292ED4F, 0x7BD94E1D8E17DEBC, 0xC7D9F16864A76E94,
+    0x947AE053EE56E63C, 0xC8C93882F9475F5F, 0x3A9BF55BA91F81CA, 0xD9A11FBB3D9808E4,
+    0x0FD22063EDC29FCA, 0xB3F256D8ACA0B0B9, 0xB03031A8B4516E84, 0x35DD37D5871448AF,
+    0xE9F6082B05542E4E, 0xEBFAFA33D7254B59, 0x9255ABB50D532280, 0xB9AB4CE57F2D34F3,
+    0x693501D628297551, 0xC62C58F97DD949BF, 0xCD454F8F19C5126A, 0xBBE83F4ECC2BDECB,
+    0xDC842B7E2819E230, 0xBA89142E007503B8, 0xA3BC941D0A5061CB, 0xE9F6760E32CD8021,
+    0x09C7E552BC76492F, 0x852F54934DA55CC9, 0x8107FCCF064FCF56, 0x098954D51FFF6580,
+    0x23B70EDB1955C4BF, 0xC330DE426430F69D, 0x4715ED43E8A45C0A, 0xA8D7E4DAB780A08D,
+    0x0572B974F03CE0BB, 0xB57D2E985E1419C7, 0xE8D9ECBE2CF3D73F, 0x2FE4B17170E59750,
+    0x11317BA87905E790, 0x7FBF21EC8A1F45EC, 0x1725CABFCB045B00, 0x964E915CD5E2B207,
+    0x3E2B8BCBF016D66D, 0xBE7444E39328A0AC, 0xF85B2B4FBCDE44B7, 0x49353FEA39BA63B1,
+    0x1DD01AAFCD53486A, 0x1FCA8A92FD719F85, 0xFC7C95D827357AFA, 0x18A6A990C8B35EBD,
+    0xCCCB7005C6B9C28D, 0x3BDBB92C43B17F26, 0xAA70B5B4F89695A2, 0xE94C39A54A98307F,
+    0xB7A0B174CFF6F36E, 0xD4DBA84729AF48AD, 0x2E18BC1AD9704A68, 0x2DE0966DAF2F8B1C,
+    0xB9C11D5B1E43A07E, 0x64972D68DEE33360, 0x94628D38D0C20584, 0xDBC0D2B6AB90A559,
+    0xD2733C4335C6A72F, 0x7E75D99D94A70F4D, 0x6CED1983376FA72B, 0x97FCAACBF030BC24,
+    0x7B77497B32503B12, 0x8547EDDFB81CCB94, 0x79999CDFF70902CB, 0xCFFE1939438E9B24,
+    0x829626E3892D95D7, 0x92FAE24291F2B3F1, 0x63E22C147B9C3403, 0xC678B6D860284A1C,
+    0x5873888850659AE7, 0x0981DCD296A8736D, 0x9F65789A6509A440, 0x9FF38FED72E9052F,
+    0xE479EE5B9930578C, 0xE7F28ECD2D49EECD, 0x56C074A581EA17FE, 0x5544F7D774B14AEF,
+    0x7B3F0195FC6F290F, 0x12153635B2C0CF57, 0x7F5126DBBA5E0CA7, 0x7A76956C3EAFB413,
+    0x3D5774A11D31AB39, 0x8A1B083821F40CB4, 0x7B4A38E32537DF62, 0x950113646D1D6E03,
+    0x4DA8979A0041E8A9, 0x3BC36E078F7515D7, 0x5D0A12F27AD310D1, 0x7F9D1A2E1EBE1327,
+    0xDA3A361B1C5157B1, 0xDCDD7D20903D0C25, 0x36833336D068F707, 0xCE68341F79893389,
+    0xAB9090168DD05F34, 0x43954B3252DC25E5, 0xB438C2B67F98E5E9, 0x10DCD78E3851A492,
+    0xDBC27AB5447822BF, 0x9B3CDB65F82CA382, 0xB67B7896167B4C84, 0xBFCED1B0048EAC50,
+    0xA9119B60369FFEBD, 0x1FFF7AC80904BF45, 0xAC12FB171817EEE7, 0xAF08DA9177DDA93D,
+    0x1B0CAB936E65C744, 0xB559EB1D04E5E932, 0xC37B45B3F8D6F2BA, 0xC3A9DC228CAAC9E9,
+    0xF3B8B6675A6507FF, 0x9FC477DE4ED681DA, 0x67378D8ECCEF96CB, 0x6DD856D94D259236,
+    0xA319CE15B0B4DB31, 0x073973751F12DD5E, 0x8A8E849EB32781A5, 0xE1925C71285279F5,
+    0x74C04BF1790C0EFE, 0x4DDA48153C94938A, 0x9D266D6A1CC0542C, 0x7440FB816508C4FE,
+    0x13328503DF48229F, 0xD6BF7BAEE43CAC40, 0x4838D65F6EF6748F, 0x1E152328F3318DEA,
+    0x8F8419A348F296BF, 0x72C8834A5957B511, 0xD7A023A73260B45C, 0x94EBC8ABCFB56DAE,
+    0x9FC10D0F989993E0, 0xDE68A2355B93CAE6, 0xA44CFE79AE538BBE, 0x9D1D84FCCE371425,
+    0x51D2B1AB2DDFB636, 0x2FD7E4B9E72CD38C, 0x65CA5B96B7552210, 0xDD69A0D8AB3B546D,
+    0x604D51B25FBF70E2, 0x73AA8A564FB7AC9E, 0x1A8C1E992B941148, 0xAAC40A2703D9BEA0,
+    0x764DBEAE7FA4F3A6, 0x1E99B96E70A9BE8B, 0x2C5E9DEB57EF4743, 0x3A938FEE32D29981,
+    0x26E6DB8FFDF5ADFE, 0x469356C504EC9F9D, 0xC8763C5B08D1908C, 0x3F6C6AF859D80055,
+    0x7F7CC39420A3A545, 0x9BFB227EBDF4C5CE, 0x89039D79D6FC5C5C, 0x8FE88B57305E2AB6,
+    0xA09E8C8C35AB96DE, 0xFA7E393983325753, 0xD6B6D0ECC617C699, 0xDFEA21EA9E7557E3,
+    0xB67C1FA481680AF8, 0xCA1E3785A9E724E5, 0x1CFC8BED0D681639, 0xD18D8549D140CAEA,
+    0x4ED0FE7E9DC91335, 0xE4DBF0634473F5D2, 0x1761F93A44D5AEFE, 0x53898E4C3910DA55,
+    0x734DE8181F6EC39A, 0x2680B122BAA28D97, 0x298AF231C85BAFAB, 0x7983EED3740847D5,
+    0x66C1A2A1A60CD889, 0x9E17E49642A3E4C1, 0xEDB454E7BADC0805, 0x50B704CAB602C329,
+    0x4CC317FB9CDDD023, 0x66B4835D9EAFEA22, 0x219B97E26FFC81BD, 0x261E4E4C0A333A9D,
+    0x1FE2CCA76517DB90, 0xD7504DFA8816EDBB, 0xB9571FA04DC089C8, 0x1DDC0325259B27DE,
+    0xCF3F4688801EB9AA, 0xF4F5D05C10CAB243, 0x38B6525C21A42B0E, 0x36F60E2BA4FA6800,
+    0xEB3593803173E0CE, 0x9C4CD6257C5A3603, 0xAF0C317D32ADAA8A, 0x258E5A80C7204C4B,
+    0x8B889D624D44885D, 0xF4D14597E660F855, 0xD4347F66EC8941C3, 0xE699ED85B0DFB40D,
+    0x2472F6207C2D0484, 0xC2A1E7B5B459AEB5, 0xAB4F6451CC1D45EC, 0x63767572AE3D6174,
+    0xA59E0BD101731A28, 0x116D0016CB948F09, 0x2CF9C8CA052F6E9F, 0x0B090A7560A968E3,
+    0xABEEDDB2DDE06FF1, 0x58EFC10B06A2068D, 0xC6E57A78FBD986E0, 0x2EAB8CA63CE802D7,
+    0x14A195640116F336, 0x7C0828DD624EC390, 0xD74BBE77E6116AC7, 0x804456AF10F5FB53,
+    0xEBE9EA2ADF4321C7, 0x03219A39EE587A30, 0x49787FEF17AF9924, 0xA1E9300CD8520548,
+    0x5B45E522E4B1B4EF, 0xB49C3B3995091A36, 0xD4490AD526F14431, 0x12A8F216AF9418C2,
+    0x001F837CC7350524, 0x1877B51E57A764D5, 0xA2853B80F17F58EE, 0x993E1DE72D36D310,
+    0xB3598080CE64A656, 0x252F59CF0D9F04BB, 0xD23C8E176D113600, 0x1BDA0492E7E4586E,
+    0x21E0BD5026C619BF, 0x3B097ADAF088F94E, 0x8D14DEDB30BE846E, 0xF95CFFA23AF5F6F4,
+    0x3871700761B3F743, 0xCA672B91E9E4FA16, 0x64C8E531BFF53B55, 0x241260ED4AD1E87D,
+    0x106C09B972D2E822, 0x7FBA195410E5CA30, 0x7884D9BC6CB569D8, 0x0647DFEDCD894A29,
+    0x63573FF03E224774, 0x4FC8E9560F91B123, 0x1DB956E450275779, 0xB8D91274B9E9D4FB,
+    0xA2EBEE47E2FBFCE1, 0xD9F1F30CCD97FB09, 0xEFED53D75FD64E6B, 0x2E6D02C36017F67F,
+    0xA9AA4D20DB084E9B, 0xB64BE8D8B25396C1, 0x70CB6AF7C2D5BCF0, 0x98F076A4F7A2322E,
+    0xBF84470805E69B5F, 0x94C3251F06F90CF3, 0x3E003E616A6591E9, 0xB925A6CD0421AFF3,
+    0x61BDD1307C66E300, 0xBF8D5108E27E0D48, 0x240AB57A8B888B20, 0xFC87614BAF287E07,
+    0xEF02CDD06FFDB432, 0xA1082C0466DF6C0A, 0x8215E577001332C8, 0xD39BB9C3A48DB6CF,
+    0x2738259634305C14, 0x61CF4F94C97DF93D, 0x1B6BACA2AE4E125B, 0x758F450C88572E0B,
+    0x959F587D507A8359, 0xB063E962E045F54D, 0x60E8ED72C0DFF5D1, 0x7B64978555326F9F,
+    0xFD080D236DA814BA, 0x8C90FD9B083F4558, 0x106F72FE81E2C590, 0x7976033A39F7D952,
+    0xA4EC0132764CA04B, 0x733EA705FAE4FA77, 0xB4D8F77BC3E56167, 0x9E21F4F903B33FD9,
+    0x9D765E419FB69F6D, 0xD30C088BA61EA5EF, 0x5D94337FBFAF7F5B, 0x1A4E4822EB4D7A59,
+    0x6FFE73E81B637FB3, 0xDDF957BC36D8B9CA, 0x64D0E29EEA8838B3, 0x08DD9BDFD96B9F63,
+    0x087E79E5A57D1D13, 0xE328E230E3E2B3FB, 0x1C2559E30F0946BE, 0x720BF5F26F4D2EAA,
+    0xB0774D261CC609DB, 0x443F64EC5A371195, 0x4112CF68649A260E, 0xD813F2FAB7F5C5CA,
+    0x660D3257380841EE, 0x59AC2C7873F910A3, 0xE846963877671A17, 0x93B633ABFA3469F8,
+    0xC0C0F5A60EF4CDCF, 0xCAF21ECD4377B28C, 0x57277707199B8175, 0x506C11B9D90E8B1D,
+    0xD83CC2687A19255F, 0x4A29C6465A314CD1, 0xED2DF21216235097, 0xB5635C95FF7296E2,
+    0x22AF003AB672E811, 0x52E762596BF68235, 0x9AEBA33AC6ECC6B0, 0x944F6DE09134DFB6,
+    0x6C47BEC883A7DE39, 0x6AD047C430A12104, 0xA5B1CFDBA0AB4067, 0x7C45D833AFF07862,
+    0x5092EF950A16DA0B, 0x9338E69C052B8E7B, 0x455A4B4CFE30E3F5, 0x6B02E63195AD0CF8,
+    0x6B17B224BAD6BF27, 0xD1E0CCD25BB9C169, 0xDE0C89A556B9AE70, 0x50065E535A213CF6,
+    0x9C1169FA2777B874, 0x78EDEFD694AF1EED, 0x6DC93D9526A50E68, 0xEE97F453F06791ED,
+    0x32AB0EDB696703D3, 0x3A6853C7E70757A7, 0x31865CED6120F37D, 0x67FEF95D92607890,
+    0x1F2B1D1F15F6DC9C, 0xB69E38A8965C6B65, 0xAA9119FF184CCCF4, 0xF43C732873F24C13,
+    0xFB4A3D794A9A80D2, 0x3550C2321FD6109C, 0x371F77E76BB8417E, 0x6BFA9AAE5EC05779,
+    0xCD04F3FF001A4778, 0xE3273522064480CA, 0x9F91508BFFCFC14A, 0x049A7F41061A9E60,
+    0xFCB6BE43A9F2FE9B, 0x08DE8A1C7797DA9B, 0x8F9887E6078735A1, 0xB5B4071DBFC73A66,
+    0x230E343DFBA08D33, 0x43ED7F5A0FAE657D, 0x3A88A0FBBCB05C63, 0x21874B8B4D2DBC4F,
+    0x1BDEA12E35F6A8C9, 0x53C065C6C8E63528, 0xE34A1D250E7A8D6B, 0xD6B04D3B7651DD7E,
+    0x5E90277E7CB39E2D, 0x2C046F22062DC67D, 0xB10BB459132D0A26, 0x3FA9DDFB67E2F199,
+    0x0E09B88E1914F7AF, 0x10E8B35AF3EEAB37, 0x9EEDECA8E272B933, 0xD4C718BC4AE8AE5F,
+    0x81536D601170FC20, 0x91B534F885818A06, 0xEC8177F83F900978, 0x190E714FADA5156E,
+    0xB592BF39B0364963, 0x89C350C893AE7DC1, 0xAC042E70F8B383F2, 0xB49B52E587A1EE60,
+    0xFB152FE3FF26DA89, 0x3E666E6F69AE2C15, 0x3B544EBE544C19F9, 0xE805A1E290CF2456,
+    0x24B33C9D7ED25117, 0xE74733427B72F0C1, 0x0A804D18B7097475, 0x57E3306D881EDB4F,
+    0x4AE7D6A36EB5DBCB, 0x2D8D5432157064C8, 0xD1E649DE1E7F268B, 0x8A328A1CEDFE552C,
+    0x07A3AEC79624C7DA, 0x84547DDC3E203C94, 0x990A98FD5071D263, 0x1A4FF12616EEFC89,
+    0xF6F7FD1431714200, 0x30C05B1BA332F41C, 0x8D2636B81555A786, 0x46C9FEB55D120902,
+    0xCCEC0A73B49C9921, 0x4E9D2827355FC492, 0x19EBB029435DCB0F, 0x4659D2B743848A2C,
+    0x963EF2C96B33BE31, 0x74F85198B05A2E7D, 0x5A0F544DD2B1FB18, 0x03727073C2E134B1,
+    0xC7F6AA2DE59AEA61, 0x352787BAA0D7C22F, 0x9853EAB63B5E0B35, 0xABBDCDD7ED5C0860,
+    0xCF05DAF5AC8D77B0, 0x49CAD48CEBF4A71E, 0x7A4C10EC2158C4A6, 0xD9E92AA246BF719E,
+    0x13AE978D09FE5557, 0x730499AF921549FF, 0x4E4B705B92903BA4, 0xFF577222C14F0A3A,
+    0x55B6344CF97AAFAE, 0xB862225B055B6960, 0xCAC09AFBDDD2CDB4, 0xDAF8E9829FE96B5F,
+    0xB5FDFC5D3132C498, 0x310CB380DB6F7503, 0xE87FBB46217A360E, 0x2102AE466EBB1148,
+    0xF8549E1A3AA5E00D, 0x07A69AFDCC42261A, 0xC4C118BFE78FEAAE, 0xF9F4892ED96BD438,
+    0x1AF3DBE25D8F45DA, 0xF5B4B0B0D2DEEEB4, 0x962ACEEFA82E1C84, 0x046E3ECAAF453CE9,
+    0xF05D129681949A4C, 0x964781CE734B3C84, 0x9C2ED44081CE5FBD, 0x522E23F3925E319E,
+    0x177E00F9FC32F791, 0x2BC60A63A6F3B3F2, 0x222BBFAE61725606, 0x486289DDCC3D6780,
+    0x7DC7785B8EFDFC80, 0x8AF38731C02BA980, 0x1FAB64EA29A2DDF7, 0xE4D9429322CD065A,
+    0x9DA058C67844F20C, 0x24C0E332B70019B0, 0x233003B5A6CFE6AD, 0xD586BD01C5C217F6,
+    0x5E5637885F29BC2B, 0x7EBA726D8C94094B, 0x0A56A5F0BFE39272, 0xD79476A84EE20D06,
+    0x9E4C1269BAA4BF37, 0x17EFEE45B0DEE640, 0x1D95B0A5FCF90BC6, 0x93CBE0B699C2585D,
+    0x65FA4F227A2B6D79, 0xD5F9E858292504D5, 0xC2B5A03F71471A6F, 0x59300222B4561E00,
+    0xCE2F8642CA0712DC, 0x7CA9723FBB2E8988, 0x2785338347F2BA08, 0xC61BB3A141E50E8C,
+    0x150F361DAB9DEC26, 0x9F6A419D382595F4, 0x64A53DC924FE7AC9, 0x142DE49FFF7A7C3D,
+    0x0C335248857FA9E7, 0x0A9C32D5EAE45305, 0xE6C42178C4BBB92E, 0x71F1CE2490D20B07,
+    0xF1BCC3D275AFE51A, 0xE728E8C83C334074, 0x96FBF83A12884624, 0x81A1549FD6573DA5,
+    0x5FA7867CAF35E149, 0x56986E2EF3ED091B, 0x917F1DD5F8886C61, 0xD20D8C88C8FFE65F,
+    0x31D71DCE64B2C310, 0xF165B587DF898190, 0xA57E6339DD2CF3A0, 0x1EF6E6DBB1961EC9,
+    0x70CC73D90BC26E24, 0xE21A6B35DF0C3AD7, 0x003A93D8B2806962, 0x1C99DED33CB890A1,
+    0xCF3145DE0ADD4289, 0xD0E4427A5514FB72, 0x77C621CC9FB3A483, 0x67A34DAC4356550B,
+    0xF8D626AAAF278509
+]
+ZOBRIST_PIECES = [0] * (16 * 64)
+for _p in [PIECE_FROM_CHAR[c] for c in "PNBRQKpnbrqk"]:
+    # tipo do Polyglot: peão preto 0, peão branco 1, cavalo preto 2, ...; casa 0 = a1 (a nossa é a8)
+    _kind = (_p & TYPE_MASK) * 2 - 2 + (PIECE_COLOR[_p] == 'w')
+    for _sq in range(64):
+        ZOBRIST_PIECES[_p*64 + _sq] = POLYGLOT_RANDOM[64*_kind + (_sq ^ 56)]
+ZOBRIST_SIDE = POLYGLOT_RANDOM[780]
+_castle_keys = POLYGLOT_RANDOM[768:772]   # K, Q, k, q: os bits de CASTLE_WK..CASTLE_BQ
+ZOBRIST_EP = POLYGLOT_RANDOM[772:780]
+# uma chave por máscara de roque (XOR das chaves de cada direito): trocar direitos é um XOR só
+ZOBRIST_CASTLING = [0] * 16
+for _mask in range(16):
+    for _i in range(4):
+        if _mask & (1 << _i):
+            ZOBRIST_CASTLING[_mask] ^= _castle_keys[_i]
+del _p, _kind, _sq, _castle_keys, _mask, _i
 
 # ----------------------------
 # Movimento e Estado
 # ----------------------------
+# Move (namedtuple) é a forma "legível" usada pela CLI. Na busca, uma jogada é um int de 16 bits:
+#   bits 0-5 origem, bits 6-11 destino, bits 12-13 peça da promoção (N,B,R,Q), bits 14-15 tipo especial.
+# Peça movida e capturada não vão na jogada: saem do board, e o que for irreversível vai para a
+# pilha de undo do GameState.
 Move = namedtuple('Move', 'from_sq to_sq piece captured promotion is_castle is_enpassant prev_castling prev_enpassant prev_halfmove')
 
+MOVE_NORMAL = 0
+MOVE_PROMOTION = 1 << 14
+MOVE_ENPASSANT = 2 << 14
+MOVE_CASTLING = 3 << 14
+MOVE_FLAG_MASK = 3 << 14
+PROMO_PIECES = {'w': [KNIGHT, BISHOP, ROOK, QUEEN],
+                'b': [KNIGHT | BLACK, BISHOP | BLACK, ROOK | BLACK, QUEEN | BLACK]}   # índice = bits 12-13
+PROMO_ORDER = (3, 2, 1, 0)                   # gerar Q, R, B, N (mesma ordem de antes)
+NULL_MOVE = 0   # a8 -> a8 nunca é jogada de verdade; marca o "passe" na pilha de undo
+
+def encode_move(from_sq, to_sq, flag=MOVE_NORMAL, promo=0):
+    return from_sq | (to_sq << 6) | (promo << 12) | flag
+
+def move_to_uci(m):
+    """Notação da CLI/UCI: e2e4, e7e8q."""
+    s = idx_to_sq(m & 63) + idx_to_sq((m >> 6) & 63)
+    if m & MOVE_FLAG_MASK == MOVE_PROMOTION:
+        s += 'nbrq'[(m >> 12) & 3]
+    return s
+
+def move_from_uci(state, text):
+    """'e2e4'/'e7e8q' -> a jogada legal correspondente nesta posição, ou None."""
+    for m in generate_legal_moves(state):
+        if move_to_uci(m) == text:
+            return m
+    return None
+
+def move_from_struct(move):
+    """Move (namedtuple) -> int."""
+    if move.promotion:
+        return encode_move(move.from_sq, move.to_sq, MOVE_PROMOTION, 'NBRQ'.index(move.promotion.upper()))
+    if move.is_enpassant:
+        return encode_move(move.from_sq, move.to_sq, MOVE_ENPASSANT)
+    if move.is_castle:
+        return encode_move(move.from_sq, move.to_sq, MOVE_CASTLING)
+    return encode_move(move.from_sq, move.to_sq)
+
+# direitos de roque mantidos quando uma jogada sai de (ou chega em) cada casa: só as casas dos reis
+# e das torres tiram algum direito
+CASTLING_KEEP = [15] * 64
+CASTLING_KEEP[60] = 15 & ~(CASTLE_WK | CASTLE_WQ)
+CASTLING_KEEP[63] = 15 & ~CASTLE_WK
+CASTLING_KEEP[56] = 15 & ~CASTLE_WQ
+CASTLING_KEEP[4] = 15 & ~(CASTLE_BK | CASTLE_BQ)
+CASTLING_KEEP[7] = 15 & ~CASTLE_BK
+CASTLING_KEEP[0] = 15 & ~CASTLE_BQ
+
+# Pilha de undo: uma lista plana pré-alocada, UNDO_SIZE campos por jogada
+# (jogada, peça capturada, roque, en passant, halfmove, zobrist anterior, material das brancas,
+# material das pretas, soma das PST). Cresce se a partida passar disso.
+UNDO_SIZE = 9
+UNDO_PLIES = 1024
+
 class GameState:
     def __init__(self, fen=START_FEN):
         self.board, self.active_color, self.castling, self.enpassant, self.halfmove, self.fullmove = fen_to_board(fen)
-        self.move_history = []
-        # Transposition key: simple Zobrist-like pseudo using random seeds for each piece-square + side + castling/enpassant
-        self.zobrist_table = None
-        self.transposition = {}
-        self.init_zobrist()
-
-    def init_zobrist(self):
-        random.seed(0xC0FFEE)  # deterministic pseudo-zobrist
-        self.zobrist_table = {}
-        pieces = list("PNBRQKpnbrqk")
-        for p in pieces:
-            for sq in range(64):
-                self.zobrist_table[(p, sq)] = random.getrandbits(64)
-        self.zobrist_table[('side', 0)] = random.getrandbits(64)
-        # castling rights bits
-        for c in ['K','Q','k','q']:
-            self.zobrist_table[('cast', c)] = random.getrandbits(64)
-        # enpassant file bits
-        for f in range(8):
-            self.zobrist_table[('ep', f)] = random.getrandbits(64)
+        self.undo = [None] * (UNDO_SIZE * UNDO_PLIES)
+        self.ply = 0   # jogadas na pilha de undo
+        # casas ocupadas por cada lado e casa de cada rei, mantidas em push/pop: os geradores
+        # percorrem só as peças e ninguém precisa varrer o board atrás do rei
+        self.piece_squares = {'w': set(), 'b': set()}
+        self.king_sq = {'w': None, 'b': None}
+        for sq, p in enumerate(self.board):
+            if p != EMPTY:
+                self.piece_squares[PIECE_COLOR[p]].add(sq)
+                if p & TYPE_MASK == KING:
+                    self.king_sq[PIECE_COLOR[p]] = sq
+        # bitboards só existem no backend BitboardState (ver abaixo); None = mailbox puro
+        self.bitboards = None
+        # as tabelas zobrist são do módulo (ZOBRIST_*), então criar um estado só custa este hash
         self.current_zobrist = self.compute_zobrist()
+        # termos da avaliação mantidos em push/pop: material de cada lado (sem o rei) e a soma das
+        # PST do ponto de vista das brancas
+        self.material, self.pst_score = self.compute_eval_terms()
 
     def compute_zobrist(self):
         h = 0
         for sq, p in enumerate(self.board):
-            if p != '.':
-                h ^= self.zobrist_table[(p, sq)]
+            if p != EMPTY:
+                h ^= ZOBRIST_PIECES[p*64 + sq]
         if self.active_color == 'b':
-            h ^= self.zobrist_table[('side', 0)]
-        for c in self.castling:
-            if c != '-':
-                h ^= self.zobrist_table[('cast', c)]
-        if self.enpassant != '-':
-            file = ord(self.enpassant[0]) - ord('a')
-            h ^= self.zobrist_table[('ep', file)]
+            h ^= ZOBRIST_SIDE
+        h ^= ZOBRIST_CASTLING[self.castling]
+        if self.enpassant != NO_SQUARE:
+            h ^= ZOBRIST_EP[file_of(self.enpassant)]
+        return h
+
+    def polyglot_key(self):
+        """Chave do livro Polyglot, derivada de current_zobrist em O(1)."""
+        h = self.current_zobrist ^ ZOBRIST_SIDE
+        ep = self.enpassant
+        if ep != NO_SQUARE:
+            # só entra se um peão de quem joga está ao lado do peão que andou duas casas
+            pawn = PAWN | COLOR_BIT[self.active_color]
+            pushed = ep + 8 if self.active_color == 'w' else ep - 8
+            f = ep & 7
+            if not ((f > 0 and self.board[pushed - 1] == pawn) or (f < 7 and self.board[pushed + 1] == pawn)):
+                h ^= ZOBRIST_EP[f]
         return h
 
-    def push_move(self, move):
+    def compute_eval_terms(self):
+        material = {'w': 0, 'b': 0}
+        pst = 0
+        for sq, p in enumerate(self.board):
+            if p != EMPTY:
+                if p & TYPE_MASK != KING:
+                    material[PIECE_COLOR[p]] += abs(PIECE_VALUES[p])
+                pst += PIECE_SQUARE[p][sq]
+        return material, pst
+
+    def last_move(self):
+        return self.undo[(self.ply - 1) * UNDO_SIZE] if self.ply else None
+
+    def push_move(self, m):
+        board = self.board
+        from_sq = m & 63
+        to_sq = (m >> 6) & 63
+        flag = m & MOVE_FLAG_MASK
+        piece = board[from_sq]
+        captured = board[to_sq]
+        h = self.current_zobrist
         # save state
-        self.move_history.append(move)
-        # update zobrist incrementally for speed
-        # but for simplicity recalc after move
-        self.board[move.to_sq] = move.promotion if move.promotion else move.piece
-        self.board[move.from_sq] = '.'
-        # handle captured removal (en passant)
-        if move.is_enpassant:
+        undo = self.undo
+        base = self.ply * UNDO_SIZE
+        if base >= len(undo):
+            undo.extend([None] * len(undo))
+        undo[base] = m
+        undo[base + 1] = captured
+        undo[base + 2] = self.castling
+        undo[base + 3] = self.enpassant
+        undo[base + 4] = self.halfmove
+        undo[base + 5] = h
+        material = self.material
+        undo[base + 6] = material['w']
+        undo[base + 7] = material['b']
+        undo[base + 8] = self.pst_score
+        self.ply += 1
+        # update zobrist incrementally: só as peças/direitos que mudam entram e saem do hash
+        zp = ZOBRIST_PIECES
+        me = self.active_color
+        them = 'b' if me == 'w' else 'w'
+        placed = PROMO_PIECES[me][(m >> 12) & 3] if flag == MOVE_PROMOTION else piece
+        h ^= zp[piece*64 + from_sq] ^ zp[placed*64 + to_sq]
+        pst = self.pst_score + PIECE_SQUARE[placed][to_sq] - PIECE_SQUARE[piece][from_sq]
+        if placed != piece:
+            material[me] += abs(PIECE_VALUES[placed]) - abs(PIECE_VALUES[piece])
+        board[to_sq] = placed
+        board[from_sq] = EMPTY
+        mine = self.piece_squares[me]
+        mine.discard(from_sq)
+        mine.add(to_sq)
+        kind = piece & TYPE_MASK
+        if kind == KING:
+            self.king_sq[me] = to_sq
+        if captured != EMPTY:
+            h ^= zp[captured*64 + to_sq]
+            self.piece_squares[them].discard(to_sq)
+            material[them] -= abs(PIECE_VALUES[captured])
+            pst -= PIECE_SQUARE[captured][to_sq]
+        elif flag == MOVE_ENPASSANT:
             # captured pawn is behind to_sq depending on side
-            if move.piece.isupper():
-                cap_sq = move.to_sq + 8
-            else:
-                cap_sq = move.to_sq - 8
-            self.board[cap_sq] = '.'
-        # handle castling rook move
-        if move.is_castle:
+            cap_sq = to_sq + 8 if me == 'w' else to_sq - 8
+            pawn = board[cap_sq]
+            h ^= zp[pawn*64 + cap_sq]
+            material[them] -= abs(PIECE_VALUES[pawn])
+            pst -= PIECE_SQUARE[pawn][cap_sq]
+            board[cap_sq] = EMPTY
+            self.piece_squares[them].discard(cap_sq)
+        elif flag == MOVE_CASTLING:
             # king side or queen side?
-            if move.to_sq % 8 == 6:  # king side
-                rook_from = move.to_sq + 1
-                rook_to = move.to_sq - 1
+            if to_sq % 8 == 6:  # king side
+                rook_from = to_sq + 1
+                rook_to = to_sq - 1
             else:  # queen side
-                rook_from = move.to_sq - 2
-                rook_to = move.to_sq + 1
-            self.board[rook_to] = self.board[rook_from]
-            self.board[rook_from] = '.'
+                rook_from = to_sq - 2
+                rook_to = to_sq + 1
+            rook = board[rook_from]
+            board[rook_to] = rook
+            board[rook_from] = EMPTY
+            mine.discard(rook_from)
+            mine.add(rook_to)
+            h ^= zp[rook*64 + rook_from] ^ zp[rook*64 + rook_to]
+            pst += PIECE_SQUARE[rook][rook_to] - PIECE_SQUARE[rook][rook_from]
+        self.pst_score = pst
 
         # update castling rights and enpassant target, halfmove, fullmove
-        self.castling = move.prev_castling if hasattr(move, 'prev_castling') else self.castling
-        self.enpassant = '-'  # reset then set below if pawn double move
-        if move.piece.upper() == 'P' and abs(move.to_sq - move.from_sq) == 16:
+        castling = self.castling
+        if castling:
+            new_castling = castling & CASTLING_KEEP[from_sq] & CASTLING_KEEP[to_sq]
+            if new_castling != castling:
+                h ^= ZOBRIST_CASTLING[castling] ^ ZOBRIST_CASTLING[new_castling]
+                self.castling = new_castling
+        if self.enpassant != NO_SQUARE:
+            h ^= ZOBRIST_EP[self.enpassant & 7]
+        self.enpassant = NO_SQUARE  # reset then set below if pawn double move
+        is_pawn = kind == PAWN
+        if is_pawn and abs(to_sq - from_sq) == 16:
             # set enpassant
-            ep_sq = (move.from_sq + move.to_sq) // 2
-            self.enpassant = idx_to_sq(ep_sq)
+            ep_sq = (from_sq + to_sq) // 2
+            self.enpassant = ep_sq
+            h ^= ZOBRIST_EP[ep_sq & 7]
         # update halfmove
-        if move.piece.upper() == 'P' or move.captured != '.':
+        if is_pawn or captured != EMPTY:
             self.halfmove = 0
         else:
             self.halfmove += 1
-        if self.active_color == 'b':
+        if me == 'b':
             self.fullmove += 1
         # switch side
-        self.active_color = 'b' if self.active_color == 'w' else 'w'
-        # recompute zobrist
-        self.current_zobrist = self.compute_zobrist()
+        self.active_color = them
+        self.current_zobrist = h ^ ZOBRIST_SIDE
 
     def pop_move(self):
-        if not self.move_history:
+        if not self.ply:
             return
-        move = self.move_history.pop()
+        self.ply -= 1
+        undo = self.undo
+        base = self.ply * UNDO_SIZE
+        m = undo[base]
+        board = self.board
+        from_sq = m & 63
+        to_sq = (m >> 6) & 63
+        flag = m & MOVE_FLAG_MASK
         # reverse move
-        self.active_color = 'b' if self.active_color == 'w' else 'w'
-        if self.active_color == 'b':
+        them = self.active_color
+        me = self.active_color = 'b' if them == 'w' else 'w'
+        if me == 'b':
             self.fullmove -= 1
-        # move piece back
-        self.board[move.from_sq] = move.piece
+        # move piece back (a promoção volta a ser peão)
+        piece = board[to_sq]
+        if flag == MOVE_PROMOTION:
+            piece = PAWN | COLOR_BIT[me]
+        elif piece & TYPE_MASK == KING:
+            self.king_sq[me] = from_sq
+        board[from_sq] = piece
+        mine = self.piece_squares[me]
+        mine.discard(to_sq)
+        mine.add(from_sq)
         # restore captured
-        if move.is_enpassant:
+        captured = undo[base + 1]
+        board[to_sq] = captured
+        if captured != EMPTY:
+            self.piece_squares[them].add(to_sq)
+        elif flag == MOVE_ENPASSANT:
             # restore captured pawn behind to_sq
-            if move.piece.isupper():
-                cap_sq = move.to_sq + 8
-                self.board[cap_sq] = 'p'
+            if me == 'w':
+                board[to_sq + 8] = PAWN | BLACK
+                self.piece_squares[them].add(to_sq + 8)
             else:
-                cap_sq = move.to_sq - 8
-                self.board[cap_sq] = 'P'
-            self.board[move.to_sq] = '.'
-        else:
-            self.board[move.to_sq] = move.captured
-        # handle castling rook revert
-        if move.is_castle:
-            if move.to_sq % 8 == 6:
-                rook_from = move.to_sq + 1
-                rook_to = move.to_sq - 1
+                board[to_sq - 8] = PAWN
+                self.piece_squares[them].add(to_sq - 8)
+        elif flag == MOVE_CASTLING:
+            # handle castling rook revert
+            if to_sq % 8 == 6:
+                rook_from = to_sq + 1
+                rook_to = to_sq - 1
             else:
-                rook_from = move.to_sq - 2
-                rook_to = move.to_sq + 1
-            self.board[rook_from] = self.board[rook_to]
-            self.board[rook_to] = '.'
+                rook_from = to_sq - 2
+                rook_to = to_sq + 1
+            board[rook_from] = board[rook_to]
+            board[rook_to] = EMPTY
+            mine.discard(rook_to)
+            mine.add(rook_from)
         # restore castling, enpassant, halfmove
-        self.castling = move.prev_castling
-        self.enpassant = move.prev_enpassant
-        self.halfmove = move.prev_halfmove
-        # recompute zobrist
-        self.current_zobrist = self.compute_zobrist()
+        self.castling = undo[base + 2]
+        self.enpassant = undo[base + 3]
+        self.halfmove = undo[base + 4]
+        self.current_zobrist = undo[base + 5]
+        self.material['w'] = undo[base + 6]
+        self.material['b'] = undo[base + 7]
+        self.pst_score = undo[base + 8]
+
+    def push_null(self):
+        """Passa a vez (null move da busca): só lado, en passant e hash mudam."""
+        undo = self.undo
+        base = self.ply * UNDO_SIZE
+        if base >= len(undo):
+            undo.extend([None] * len(undo))
+        undo[base] = NULL_MOVE
+        undo[base + 3] = self.enpassant
+        undo[base + 4] = self.halfmove
+        undo[base + 5] = self.current_zobrist
+        self.ply += 1
+        h = self.current_zobrist ^ ZOBRIST_SIDE
+        if self.enpassant != NO_SQUARE:
+            h ^= ZOBRIST_EP[self.enpassant & 7]
+            self.enpassant = NO_SQUARE
+        self.halfmove += 1
+        self.active_color = 'b' if self.active_color == 'w' else 'w'
+        self.current_zobrist = h
+
+    def pop_null(self):
+        self.ply -= 1
+        base = self.ply * UNDO_SIZE
+        undo = self.undo
+        self.enpassant = undo[base + 3]
+        self.halfmove = undo[base + 4]
+        self.current_zobrist = undo[base + 5]
+        self.active_color = 'b' if self.active_color == 'w' else 'w'
+
+    def unwind(self, ply):
+        """Desfaz jogadas (e null moves) até a pilha voltar a ply: limpeza depois de abortar a busca."""
+        while self.ply > ply:
+            if self.last_move() == NULL_MOVE:
+                self.pop_null()
+            else:
+                self.pop_move()
+
+    def has_non_pawn_material(self, color):
+        """color tem alguma peça além de rei e peões? (sem isso o null move erra em zugzwang)"""
+        board = self.board
+        for sq in self.piece_squares[color]:
+            kind = board[sq] & TYPE_MASK
+            if kind != PAWN and kind != KING:
+                return True
+        return False
 
     def make_move_struct(self, from_sq, to_sq, promotion=None):
-        piece = self.board[from_sq]
-        captured = self.board[to_sq]
+        # Move é a forma da CLI: peças como caracteres, roque/en passant como no FEN
+        piece = PIECE_CHARS[self.board[from_sq]]
+        captured = PIECE_CHARS[self.board[to_sq]]
         is_enpassant = False
         is_castle = False
-        # detect en passant capture
-        if piece.upper() == 'P' and to_sq == (sq_to_coords(self.enpassant) if self.enpassant != '-' else -1):
-            # direct index compare might not match; instead check move matches enpassant file and correct rank
-            pass
-        # Better detect enpassant: if pawn moves diagonally and captured square empty and enpassant target matches to_sq
+        # detect en passant: if pawn moves diagonally and captured square empty and enpassant target matches to_sq
         if piece.upper() == 'P' and captured == '.':
             from_file = from_sq % 8
             to_file = to_sq % 8
             if abs(from_file - to_file) == 1:
                 # maybe enpassant
-                if self.enpassant != '-':
-                    ep_sq = sq_to_coords(self.enpassant)
+                if self.enpassant != NO_SQUARE:
+                    ep_sq = self.enpassant
                     if to_sq == ep_sq:
                         is_enpassant = True
                         # captured pawn is behind
@@ -250,17 +704,24 @@ class GameState:
             is_castle = True
         m = Move(from_sq=from_sq, to_sq=to_sq, piece=piece, captured=captured,
                  promotion=promotion, is_castle=is_castle, is_enpassant=is_enpassant,
-                 prev_castling=self.castling, prev_enpassant=self.enpassant, prev_halfmove=self.halfmove)
+                 prev_castling=castling_to_str(self.castling),
+                 prev_enpassant=idx_to_sq(self.enpassant) if self.enpassant != NO_SQUARE else '-',
+                 prev_halfmove=self.halfmove)
         return m
 
     def print_board(self):
         print("  +-----------------+")
         for r in range(8):
             row = self.board[r*8:(r+1)*8]
-            print(8-r, '|', ' '.join(row), '|')
+            print(8-r, '|', ' '.join(PIECE_CHARS[p] for p in row), '|')
         print("  +-----------------+")
         print("    a b c d e f g h")
-        print(f"Side: {self.active_color}  Castling: {self.castling}  Enpassant: {self.enpassant}  Move: {self.fullmove}  Halfmove: {self.halfmove}")
+        ep = idx_to_sq(self.enpassant) if self.enpassant != NO_SQUARE else '-'
+        print(f"Side: {self.active_color}  Castling: {castling_to_str(self.castling)}  Enpassant: {ep}  Move: {self.fullmove}  Halfmove: {self.halfmove}")
+
+    def fen(self):
+        return board_to_fen(self.board, self.active_color, self.castling, self.enpassant,
+                            self.halfmove, self.fullmove)
 
 # ----------------------------
 # Geração de Movimentos
@@ -285,192 +746,205 @@ def rank_of(i):
 def same_file(i, j):
     return file_of(i) == file_of(j)
 
+# Tabelas por casa montadas na importação: geradores e teste de ataque percorrem estas listas em vez
+# de somar offsets e conferir on_board/volta de coluna a cada passo.
+def _step_squares(sq, offsets, max_df):
+    return [sq + off for off in offsets
+            if on_board(sq + off) and abs(file_of(sq + off) - file_of(sq)) <= max_df]
+
+def _ray_squares(sq, d):
+    ray = []
+    to = sq + d
+    while on_board(to) and abs(file_of(to) - file_of(to - d)) <= 1:
+        ray.append(to)
+        to += d
+    return ray
+
+KNIGHT_TARGETS = [_step_squares(sq, KNIGHT_OFFSETS, 2) for sq in range(64)]
+KING_TARGETS = [_step_squares(sq, KING_OFFSETS, 1) for sq in range(64)]
+# casas que um peão da cor dada, em sq, captura
+PAWN_CAPTURE_TARGETS = {'w': [_step_squares(sq, (-9, -7), 1) for sq in range(64)],
+                        'b': [_step_squares(sq, (7, 9), 1) for sq in range(64)]}
+# RAYS[d][sq]: casas a partir de sq na direção d, em ordem, até a borda
+RAYS = {d: [_ray_squares(sq, d) for sq in range(64)] for d in QUEEN_DIRS}
+
+# Quais jogadas gerar (a busca pede capturas e quietas em estágios separados):
+# GEN_CAPTURES = capturas, en passant e todas as promoções; GEN_QUIETS = o resto, inclusive roque.
+GEN_CAPTURES = 1
+GEN_QUIETS = 2
+GEN_ALL = GEN_CAPTURES | GEN_QUIETS
+
 def generate_pseudo_legal_moves(state: GameState):
     """Gera movimentos pseudo-legais (não necessariamente deixando o rei em xeque)."""
+    if state.bitboards is not None:
+        return bb_generate_pseudo_legal_moves(state)
     moves = []
     board = state.board
     me = state.active_color
-    for i, p in enumerate(board):
-        if p == '.': continue
-        if (me == 'w' and p.islower()) or (me == 'b' and p.isupper()):
-            continue
-        if p.upper() == 'P':
+    for i in state.piece_squares[me]:
+        kind = board[i] & TYPE_MASK
+        if kind == PAWN:
             generate_pawn_moves(state, i, moves)
-        elif p.upper() == 'N':
+        elif kind == KNIGHT:
             generate_knight_moves(state, i, moves)
-        elif p.upper() == 'B':
+        elif kind == BISHOP:
             generate_sliding_moves(state, i, BISHOP_DIRS, moves)
-        elif p.upper() == 'R':
+        elif kind == ROOK:
             generate_sliding_moves(state, i, ROOK_DIRS, moves)
-        elif p.upper() == 'Q':
+        elif kind == QUEEN:
             generate_sliding_moves(state, i, QUEEN_DIRS, moves)
-        elif p.upper() == 'K':
+        elif kind == KING:
             generate_king_moves(state, i, moves)
     return moves
 
-def generate_pawn_moves(state, i, moves):
+def generate_pawn_moves(state, i, moves, kinds=GEN_ALL):
     board = state.board
-    p = board[i]
-    dir_forward = -8 if p.isupper() else 8
-    start_rank = 6 if p.isupper() else 1
-    promote_rank = 0 if p.isupper() else 7
-    to_sq = i + dir_forward
+    me = PIECE_COLOR[board[i]]
+    white = me == 'w'
+    dir_forward = -8 if white else 8
+    start_rank = 6 if white else 1
+    promote_rank = 0 if white else 7
+    to_sq = i + dir_forward   # peão nunca está na última fileira, então to_sq está no tabuleiro
     # forward one
-    if on_board(to_sq) and board[to_sq] == '.':
+    if board[to_sq] == EMPTY:
         if rank_of(to_sq) == promote_rank:
-            for prom in ['Q','R','B','N']:
-                promotion = prom if p.isupper() else prom.lower()
-                moves.append(state.make_move_struct(i, to_sq, promotion=promotion))
-        else:
-            moves.append(state.make_move_struct(i, to_sq, promotion=None))
+            if kinds & GEN_CAPTURES:
+                for prom in PROMO_ORDER:
+                    moves.append(i | (to_sq << 6) | (prom << 12) | MOVE_PROMOTION)
+        elif kinds & GEN_QUIETS:
+            moves.append(i | (to_sq << 6))
             # forward two
             if rank_of(i) == start_rank:
                 to2 = i + 2*dir_forward
-                if board[to2] == '.':
-                    moves.append(state.make_move_struct(i, to2, promotion=None))
+                if board[to2] == EMPTY:
+                    moves.append(i | (to2 << 6))
+    if not kinds & GEN_CAPTURES:
+        return
     # captures
-    for df in (-1, 1):
-        file = file_of(i) + df
-        if 0 <= file < 8:
-            cap_sq = i + dir_forward + df
-            if on_board(cap_sq):
-                target = board[cap_sq]
-                if target != '.' and color_of(target) and color_of(target) != color_of(p):
-                    if rank_of(cap_sq) == promote_rank:
-                        for prom in ['Q','R','B','N']:
-                            promotion = prom if p.isupper() else prom.lower()
-                            moves.append(state.make_move_struct(i, cap_sq, promotion=promotion))
-                    else:
-                        moves.append(state.make_move_struct(i, cap_sq, promotion=None))
+    captures = PAWN_CAPTURE_TARGETS[me][i]
+    for cap_sq in captures:
+        target = board[cap_sq]
+        if target != EMPTY and PIECE_COLOR[target] != me:
+            if rank_of(cap_sq) == promote_rank:
+                for prom in PROMO_ORDER:
+                    moves.append(i | (cap_sq << 6) | (prom << 12) | MOVE_PROMOTION)
+            else:
+                moves.append(i | (cap_sq << 6))
     # en passant
-    if state.enpassant != '-':
-        ep_idx = sq_to_coords(state.enpassant)
+    ep_idx = state.enpassant
+    if ep_idx != NO_SQUARE:
         # enpassant capture occurs when pawn moves diagonally to ep square
-        for df in (-1, 1):
-            if file_of(i) + df == file_of(ep_idx) and rank_of(ep_idx) == rank_of(i) + ( -1 if p.isupper() else 1 ):
-                moves.append(state.make_move_struct(i, ep_idx, promotion=None))
+        if ep_idx in captures:
+            moves.append(i | (ep_idx << 6) | MOVE_ENPASSANT)
 
-def generate_knight_moves(state, i, moves):
+def generate_step_moves(state, i, targets, moves, kinds=GEN_ALL):
+    # cavalo e rei: um passo para cada casa da tabela
     board = state.board
-    p = board[i]
-    for off in KNIGHT_OFFSETS:
-        to = i + off
-        if not on_board(to): continue
-        # avoid wrap around
-        if abs(file_of(i) - file_of(to)) > 2: continue
+    me = PIECE_COLOR[board[i]]
+    quiets = kinds & GEN_QUIETS
+    captures = kinds & GEN_CAPTURES
+    for to in targets[i]:
         target = board[to]
-        if target == '.' or color_of(target) != color_of(p):
-            moves.append(state.make_move_struct(i, to, promotion=None))
+        if target == EMPTY:
+            if quiets:
+                moves.append(i | (to << 6))
+        elif captures and PIECE_COLOR[target] != me:
+            moves.append(i | (to << 6))
+
+def generate_knight_moves(state, i, moves, kinds=GEN_ALL):
+    generate_step_moves(state, i, KNIGHT_TARGETS, moves, kinds)
 
-def generate_sliding_moves(state, i, dirs, moves):
+def generate_sliding_moves(state, i, dirs, moves, kinds=GEN_ALL):
     board = state.board
-    p = board[i]
+    me = PIECE_COLOR[board[i]]
+    quiets = kinds & GEN_QUIETS
     for d in dirs:
-        to = i + d
-        while on_board(to) and abs(file_of(to) - file_of(to - d)) <= 1:
+        for to in RAYS[d][i]:
             target = board[to]
-            if target == '.':
-                moves.append(state.make_move_struct(i, to, promotion=None))
+            if target == EMPTY:
+                if quiets:
+                    moves.append(i | (to << 6))
             else:
-                if color_of(target) != color_of(p):
-                    moves.append(state.make_move_struct(i, to, promotion=None))
+                if PIECE_COLOR[target] != me and kinds & GEN_CAPTURES:
+                    moves.append(i | (to << 6))
                 break
-            to += d
 
-def generate_king_moves(state, i, moves):
+def generate_king_moves(state, i, moves, kinds=GEN_ALL):
     board = state.board
-    p = board[i]
-    for off in KING_OFFSETS:
-        to = i + off
-        if not on_board(to): continue
-        if abs(file_of(i) - file_of(to)) > 1: continue
-        target = board[to]
-        if target == '.' or color_of(target) != color_of(p):
-            moves.append(state.make_move_struct(i, to, promotion=None))
-    # castling rights
-    if p.isupper() and state.active_color == 'w':
-        if 'K' in state.castling:
+    me = PIECE_COLOR[board[i]]
+    generate_step_moves(state, i, KING_TARGETS, moves, kinds)
+    if not kinds & GEN_QUIETS:
+        return
+    # castling rights (o rei não pode sair, passar ou chegar em casa atacada)
+    castling = state.castling
+    if me == 'w' and state.active_color == 'w':
+        if castling & CASTLE_WK:
             # white king side: e1->g1 indices: e1=60 g1=62
-            if state.board[61] == '.' and state.board[62] == '.':
-                # TODO: check squares not attacked
-                moves.append(state.make_move_struct(i, i+2, promotion=None))
-        if 'Q' in state.castling:
-            if state.board[59] == '.' and state.board[58] == '.' and state.board[57] == '.':
-                moves.append(state.make_move_struct(i, i-2, promotion=None))
-    if p.islower() and state.active_color == 'b':
-        if 'k' in state.castling:
-            if state.board[5] == '.' and state.board[6] == '.':
-                moves.append(state.make_move_struct(i, i+2, promotion=None))
-        if 'q' in state.castling:
-            if state.board[3] == '.' and state.board[2] == '.' and state.board[1] == '.':
-                moves.append(state.make_move_struct(i, i-2, promotion=None))
+            if board[61] == EMPTY and board[62] == EMPTY:
+                if not any(is_square_attacked(state, s, 'b') for s in (60, 61, 62)):
+                    moves.append(i | ((i+2) << 6) | MOVE_CASTLING)
+        if castling & CASTLE_WQ:
+            if board[59] == EMPTY and board[58] == EMPTY and board[57] == EMPTY:
+                if not any(is_square_attacked(state, s, 'b') for s in (60, 59, 58)):
+                    moves.append(i | ((i-2) << 6) | MOVE_CASTLING)
+    if me == 'b' and state.active_color == 'b':
+        if castling & CASTLE_BK:
+            if board[5] == EMPTY and board[6] == EMPTY:
+                if not any(is_square_attacked(state, s, 'w') for s in (4, 5, 6)):
+                    moves.append(i | ((i+2) << 6) | MOVE_CASTLING)
+        if castling & CASTLE_BQ:
+            if board[3] == EMPTY and board[2] == EMPTY and board[1] == EMPTY:
+                if not any(is_square_attacked(state, s, 'w') for s in (4, 3, 2)):
+                    moves.append(i | ((i-2) << 6) | MOVE_CASTLING)
 
 # ----------------------------
 # Legality: detectar xeque e filtrar movimentos ilegais
 # ----------------------------
 def is_square_attacked(state, sq, by_color):
+    if state.bitboards is not None:
+        return bb_is_square_attacked(state, sq, by_color)
     board = state.board
-    # pawns
-    if by_color == 'w':
-        # white pawns attack from below (sq+7, sq+9)
-        for off in (-9, -7):
-            src = sq + off
-            if on_board(src) and file_of(src) != file_of(sq):
-                p = board[src]
-                if p == 'P': return True
-    else:
-        for off in (9,7):
-            src = sq + off
-            if on_board(src) and file_of(src) != file_of(sq):
-                p = board[src]
-                if p == 'p': return True
+    bit = COLOR_BIT[by_color]
+    pawn, knight, bishop, rook, queen, king = (PAWN | bit, KNIGHT | bit, BISHOP | bit,
+                                               ROOK | bit, QUEEN | bit, KING | bit)
+    # pawns: um peão de by_color ataca sq se estiver numa casa que um peão do outro lado, em sq, capturaria
+    for src in PAWN_CAPTURE_TARGETS['b' if by_color == 'w' else 'w'][sq]:
+        if board[src] == pawn:
+            return True
     # knights
-    for off in KNIGHT_OFFSETS:
-        src = sq + off
-        if on_board(src) and abs(file_of(src) - file_of(sq)) <= 2:
-            p = board[src]
-            if p != '.' and color_of(p) == by_color and p.upper() == 'N':
-                return True
+    for src in KNIGHT_TARGETS[sq]:
+        if board[src] == knight:
+            return True
     # bishops/queens diagonals
     for d in BISHOP_DIRS:
-        src = sq + d
-        while on_board(src) and abs(file_of(src) - file_of(src - d)) <= 1:
+        for src in RAYS[d][sq]:
             p = board[src]
-            if p != '.':
-                if color_of(p) == by_color and (p.upper() == 'B' or p.upper() == 'Q'):
+            if p != EMPTY:
+                if p == bishop or p == queen:
                     return True
                 break
-            src += d
     # rooks/queens straights
     for d in ROOK_DIRS:
-        src = sq + d
-        while on_board(src) and abs(file_of(src) - file_of(src - d)) <= 1:
+        for src in RAYS[d][sq]:
             p = board[src]
-            if p != '.':
-                if color_of(p) == by_color and (p.upper() == 'R' or p.upper() == 'Q'):
+            if p != EMPTY:
+                if p == rook or p == queen:
                     return True
                 break
-            src += d
     # king
-    for off in KING_OFFSETS:
-        src = sq + off
-        if on_board(src) and abs(file_of(src) - file_of(sq)) <= 1:
-            p = board[src]
-            if p != '.' and color_of(p) == by_color and p.upper() == 'K':
-                return True
+    for src in KING_TARGETS[sq]:
+        if board[src] == king:
+            return True
     return False
 
 def filter_legal_moves(state, moves):
+    if state.bitboards is not None:
+        return bb_filter_legal_moves(state, moves)
     legal = []
     for m in moves:
         state.push_move(m)
         # find king square of the side that moved? Actually we need to check opponent's attack to our king after move
-        # find own king:
-        king = 'K' if state.active_color == 'b' else 'k'  # since we switched side after push
-        king_sq = None
-        for i, p in enumerate(state.board):
-            if p == king:
-                king_sq = i; break
+        king_sq = state.king_sq['w' if state.active_color == 'b' else 'b']  # since we switched side after push
         if king_sq is None:
             # illegal: king captured (shouldn't normally happen)
             ok = False
@@ -482,15 +956,636 @@ def filter_legal_moves(state, moves):
             legal.append(m)
     return legal
 
+def king_square(state, color):
+    return state.king_sq[color]
+
+def in_check(state):
+    """O lado que vai jogar está em xeque?"""
+    me = state.active_color
+    king_sq = king_square(state, me)
+    return king_sq is not None and is_square_attacked(state, king_sq, 'b' if me == 'w' else 'w')
+
+def king_danger(state, king_sq):
+    """Xeques e cravadas contra o rei de quem joga, calculados uma vez por posição.
+
+    Retorna (checkers, evasion, pins): casas das peças que dão xeque; casas que resolvem um xeque
+    simples (capturar a peça ou bloquear a linha); e {casa cravada: casas da linha rei..cravador}.
+    """
+    board = state.board
+    me = state.active_color
+    checkers = []
+    evasion = None
+    pins = {}
+    for d in QUEEN_DIRS:
+        sliders = (BISHOP, QUEEN) if d in BISHOP_DIRS else (ROOK, QUEEN)
+        ray = []
+        blocker = None
+        for to in RAYS[d][king_sq]:
+            ray.append(to)
+            p = board[to]
+            if p != EMPTY:
+                if PIECE_COLOR[p] == me:
+                    if blocker is not None:
+                        break  # duas peças nossas na linha: nada a fazer
+                    blocker = to
+                else:
+                    if p & TYPE_MASK in sliders:
+                        if blocker is None:
+                            checkers.append(to)
+                            evasion = set(ray)
+                        else:
+                            pins[blocker] = set(ray)
+                    break
+    enemy_knight = KNIGHT | (BLACK if me == 'w' else WHITE)
+    for src in KNIGHT_TARGETS[king_sq]:
+        if board[src] == enemy_knight:
+            checkers.append(src)
+            evasion = {src}
+    enemy_pawn = PAWN | (BLACK if me == 'w' else WHITE)
+    for src in PAWN_CAPTURE_TARGETS[me][king_sq]:
+        if board[src] == enemy_pawn:
+            checkers.append(src)
+            evasion = {src}
+    return checkers, evasion, pins
+
+def generate_legal_moves(state, kinds=GEN_ALL):
+    """Gera direto as jogadas legais: xeques e cravadas são calculados uma vez, sem make/unmake por jogada.
+
+    Só o en passant (que pode descobrir xeque na horizontal ao tirar dois peões da fileira) ainda é
+    testado jogando e desfazendo. kinds (GEN_CAPTURES/GEN_QUIETS) restringe o que é gerado.
+    """
+    if state.bitboards is not None:
+        return bb_generate_legal_moves(state, kinds)
+    board = state.board
+    me = state.active_color
+    them = 'b' if me == 'w' else 'w'
+    king_sq = king_square(state, me)
+    checkers, evasion, pins = king_danger(state, king_sq)
+    moves = []
+    if len(checkers) < 2:
+        # duplo xeque: só o rei pode mexer
+        pseudo = []
+        for i in state.piece_squares[me]:
+            kind = board[i] & TYPE_MASK
+            if kind == PAWN:
+                generate_pawn_moves(state, i, pseudo, kinds)
+            elif kind == KNIGHT:
+                if i not in pins:  # cavalo cravado nunca se mexe
+                    generate_knight_moves(state, i, pseudo, kinds)
+            elif kind == BISHOP:
+                generate_sliding_moves(state, i, BISHOP_DIRS, pseudo, kinds)
+            elif kind == ROOK:
+                generate_sliding_moves(state, i, ROOK_DIRS, pseudo, kinds)
+            elif kind == QUEEN:
+                generate_sliding_moves(state, i, QUEEN_DIRS, pseudo, kinds)
+        for m in pseudo:
+            if m & MOVE_FLAG_MASK == MOVE_ENPASSANT:
+                if is_legal_by_make(state, m):
+                    moves.append(m)
+                continue
+            to = (m >> 6) & 63
+            if checkers and to not in evasion:
+                continue
+            line = pins.get(m & 63)
+            if line is not None and to not in line:
+                continue
+            moves.append(m)
+    # rei: a casa de destino não pode estar atacada com o rei fora do tabuleiro (senão ele
+    # "se esconde" atrás de si mesmo na linha de uma peça deslizante)
+    king_moves = []
+    generate_king_moves(state, king_sq, king_moves, kinds)
+    king = board[king_sq]
+    board[king_sq] = EMPTY
+    for m in king_moves:
+        if m & MOVE_FLAG_MASK == MOVE_CASTLING:
+            # generate_king_moves já conferiu as casas do caminho, inclusive a de saída
+            moves.append(m)
+        elif not is_square_attacked(state, (m >> 6) & 63, them):
+            moves.append(m)
+    board[king_sq] = king
+    return moves
+
+def generate_captures(state):
+    """Só capturas (com en passant) e promoções legais: o gerador da quiescence."""
+    return generate_legal_moves(state, GEN_CAPTURES)
+
+def is_pseudo_legal(state, m):
+    """m é uma jogada possível (ignorando o próprio rei em xeque) nesta posição?
+
+    Para jogadas que não vieram do gerador desta posição: hash move e killers, que podem ser de
+    outra posição (colisão de chave, ou outro ramo da árvore).
+    """
+    board = state.board
+    me = state.active_color
+    from_sq = m & 63
+    to_sq = (m >> 6) & 63
+    flag = m & MOVE_FLAG_MASK
+    if flag != MOVE_PROMOTION and (m >> 12) & 3:
+        return False   # bits de promoção só existem em promoções
+    p = board[from_sq]
+    if p == EMPTY or PIECE_COLOR[p] != me:
+        return False
+    target = board[to_sq]
+    if target != EMPTY and PIECE_COLOR[target] == me:
+        return False
+    kind = p & TYPE_MASK
+    if flag == MOVE_CASTLING:
+        if kind != KING:
+            return False
+        castles = []
+        generate_king_moves(state, from_sq, castles, GEN_QUIETS)
+        return m in castles
+    if kind == PAWN:
+        white = me == 'w'
+        forward = -8 if white else 8
+        if flag == MOVE_ENPASSANT:
+            return to_sq == state.enpassant and to_sq in PAWN_CAPTURE_TARGETS[me][from_sq]
+        if (flag == MOVE_PROMOTION) != (rank_of(to_sq) == (0 if white else 7)):
+            return False
+        if to_sq in PAWN_CAPTURE_TARGETS[me][from_sq]:
+            return target != EMPTY
+        if to_sq == from_sq + forward:
+            return target == EMPTY
+        if to_sq == from_sq + 2*forward and rank_of(from_sq) == (6 if white else 1):
+            return target == EMPTY and board[from_sq + forward] == EMPTY
+        return False
+    if flag != MOVE_NORMAL:
+        return False
+    if kind == KNIGHT:
+        return to_sq in KNIGHT_TARGETS[from_sq]
+    if kind == KING:
+        return to_sq in KING_TARGETS[from_sq]
+    dirs = BISHOP_DIRS if kind == BISHOP else ROOK_DIRS if kind == ROOK else QUEEN_DIRS
+    for d in dirs:
+        for to in RAYS[d][from_sq]:
+            if to == to_sq:
+                return True
+            if board[to] != EMPTY:
+                break
+    return False
+
+def is_legal_by_make(state, m):
+    state.push_move(m)
+    king_sq = king_square(state, 'b' if state.active_color == 'w' else 'w')
+    ok = king_sq is not None and not is_square_attacked(state, king_sq, state.active_color)
+    state.pop_move()
+    return ok
+
+# ----------------------------
+# SEE (static exchange evaluation)
+# ----------------------------
+# Valor (em centipeões) da sequência de capturas numa casa, cada lado sempre recapturando com a
+# peça menos valiosa e podendo parar quando continuar piora. As peças já usadas saem da
+# "ocupação", então deslizantes atrás delas (x-ray: torre atrás de torre, dama atrás de bispo...)
+# entram na troca sozinhas. Só lê state.board, então vale para os dois backends.
+# Os valores (SEE_VALUES) ficam na seção de avaliação, junto de PIECE_VALUES.
+
+def _least_attacker(board, sq, color, removed):
+    """(casa, peça) do atacante menos valioso de color em sq, ignorando as casas em removed."""
+    bit = COLOR_BIT[color]
+    pawn = PAWN | bit
+    for src in PAWN_CAPTURE_TARGETS['b' if color == 'w' else 'w'][sq]:
+        if board[src] == pawn and src not in removed:
+            return src, pawn
+    knight = KNIGHT | bit
+    for src in KNIGHT_TARGETS[sq]:
+        if board[src] == knight and src not in removed:
+            return src, knight
+    # primeira peça de cada raio (pulando as removidas)
+    diag = []
+    line = []
+    for d in QUEEN_DIRS:
+        for src in RAYS[d][sq]:
+            p = board[src]
+            if p != EMPTY and src not in removed:
+                if PIECE_COLOR[p] == color:
+                    (diag if d in BISHOP_DIRS else line).append((src, p))
+                break
+    for src, p in diag:
+        if p & TYPE_MASK == BISHOP:
+            return src, p
+    for src, p in line:
+        if p & TYPE_MASK == ROOK:
+            return src, p
+    for src, p in diag + line:
+        if p & TYPE_MASK == QUEEN:
+            return src, p
+    king = KING | bit
+    for src in KING_TARGETS[sq]:
+        if board[src] == king and src not in removed:
+            return src, king
+    return None, EMPTY
+
+def see(state, m):
+    """Saldo material de fazer a captura m e deixar a troca em to_sq seguir até o fim."""
+    board = state.board
+    from_sq = m & 63
+    to_sq = (m >> 6) & 63
+    flag = m & MOVE_FLAG_MASK
+    me = state.active_color
+    attacker = board[from_sq]
+    if flag == MOVE_ENPASSANT:
+        gain = [SEE_VALUES[PAWN]]
+    else:
+        gain = [SEE_VALUES[board[to_sq]]]
+    if flag == MOVE_PROMOTION:
+        attacker = PROMO_PIECES[me][(m >> 12) & 3]
+        gain[0] += SEE_VALUES[attacker] - SEE_VALUES[PAWN]
+    removed = {from_sq}
+    side = 'b' if me == 'w' else 'w'
+    d = 0
+    while True:
+        d += 1
+        # se o lado da vez recapturar, ganha a peça que está na casa e arrisca o resto
+        gain.append(SEE_VALUES[attacker] - gain[d - 1])
+        if max(-gain[d - 1], gain[d]) < 0:
+            break   # nenhum dos lados melhora continuando
+        src, attacker = _least_attacker(board, to_sq, side, removed)
+        if src is None:
+            break
+        if attacker & TYPE_MASK == KING:
+            # o rei só recaptura se o outro lado não tiver mais quem ataque a casa
+            other = 'b' if side == 'w' else 'w'
+            if _least_attacker(board, to_sq, other, removed | {src})[0] is not None:
+                break
+        removed.add(src)
+        side = 'b' if side == 'w' else 'w'
+    d -= 1
+    while d:
+        gain[d - 1] = -max(-gain[d - 1], gain[d])
+        d -= 1
+    return gain[0]
+
+# ----------------------------
+# Backend Bitboard
+# ----------------------------
+# Alternativa ao array de 64 strings: um inteiro de 64 bits por tipo de peça e cor, mais as
+# ocupações por cor. O bit i corresponde à casa i (mesma numeração do board: 0 = a8, 63 = h1).
+# O board em lista continua sendo mantido (FEN, impressão, avaliação e push/pop usam ele),
+# mas geração de movimentos e detecção de ataque rodam só nos bitboards.
+BB_ALL = (1 << 64) - 1
+BIT = [1 << sq for sq in range(64)]
+FILE_A_BB = sum(BIT[r*8] for r in range(8))
+FILE_H_BB = FILE_A_BB << 7
+RANK_8_BB = 0xFF
+RANK_1_BB = 0xFF << 56
+RANK_3_BB = 0xFF << 40   # destino do primeiro passo de um peão branco que pode andar duas
+RANK_6_BB = 0xFF << 16   # idem para as pretas
+
+def _step_targets(sq, deltas):
+    # deltas em (rank, file); retorna o bitboard das casas alcançáveis em um passo
+    r, f = rank_of(sq), file_of(sq)
+    bb = 0
+    for dr, df in deltas:
+        rr, ff = r + dr, f + df
+        if 0 <= rr < 8 and 0 <= ff < 8:
+            bb |= BIT[rr*8 + ff]
+    return bb
+
+KNIGHT_ATTACKS = [_step_targets(sq, [(-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)]) for sq in range(64)]
+KING_ATTACKS = [_step_targets(sq, [(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)]) for sq in range(64)]
+# casas atacadas por um peão da cor dada que está em sq
+PAWN_ATTACKS = {'w': [_step_targets(sq, [(-1,-1),(-1,1)]) for sq in range(64)],
+                'b': [_step_targets(sq, [(1,-1),(1,1)]) for sq in range(64)]}
+
+def _ray_attacks(sq, occ, deltas):
+    # ataque deslizante "lento", usado só para montar as tabelas
+    bb = 0
+    for dr, df in deltas:
+        rr, ff = rank_of(sq) + dr, file_of(sq) + df
+        while 0 <= rr < 8 and 0 <= ff < 8:
+            b = BIT[rr*8 + ff]
+            bb |= b
+            if occ & b:
+                break
+            rr += dr; ff += df
+    return bb
+
+def _line_mask(sq, deltas):
+    # casas relevantes da linha: sem a própria casa e sem a borda (a borda nunca bloqueia nada além dela)
+    mask = 0
+    for dr, df in deltas:
+        rr, ff = rank_of(sq) + dr, file_of(sq) + df
+        while 0 <= rr + dr < 8 and 0 <= ff + df < 8:
+            mask |= BIT[rr*8 + ff]
+            rr += dr; ff += df
+    return mask
+
+def _build_line_table(deltas):
+    # Estilo kindergarten: a ocupação de UMA linha (rank, file, diagonal ou antidiagonal) já restrita às
+    # casas relevantes é a chave de uma tabela pequena (no máximo 64 entradas por casa).
+    masks, tables = [], []
+    for sq in range(64):
+        mask = _line_mask(sq, deltas)
+        table = {}
+        sub = 0
+        while True:  # enumera todos os subconjuntos de mask (carry-rippler)
+            table[sub] = _ray_attacks(sq, sub, deltas)
+            sub = (sub - mask) & mask
+            if sub == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+RANK_MASK, RANK_ATTACKS = _build_line_table([(0,-1),(0,1)])
+FILE_MASK, FILE_ATTACKS = _build_line_table([(-1,0),(1,0)])
+DIAG_MASK, DIAG_ATTACKS = _build_line_table([(-1,1),(1,-1)])
+ANTI_MASK, ANTI_ATTACKS = _build_line_table([(-1,-1),(1,1)])
+
+def _between(a, b):
+    # casas estritamente entre a e b se estiverem na mesma linha/coluna/diagonal; senão 0
+    dr = rank_of(b) - rank_of(a)
+    df = file_of(b) - file_of(a)
+    if a == b or (dr and df and abs(dr) != abs(df)):
+        return 0
+    step_r = (dr > 0) - (dr < 0)
+    step_f = (df > 0) - (df < 0)
+    bb = 0
+    rr, ff = rank_of(a) + step_r, file_of(a) + step_f
+    while (rr, ff) != (rank_of(b), file_of(b)):
+        bb |= BIT[rr*8 + ff]
+        rr += step_r; ff += step_f
+    return bb
+
+BETWEEN = [[_between(a, b) for b in range(64)] for a in range(64)]
+
+def rook_attacks(sq, occ):
+    return RANK_ATTACKS[sq][occ & RANK_MASK[sq]] | FILE_ATTACKS[sq][occ & FILE_MASK[sq]]
+
+def bishop_attacks(sq, occ):
+    return DIAG_ATTACKS[sq][occ & DIAG_MASK[sq]] | ANTI_ATTACKS[sq][occ & ANTI_MASK[sq]]
+
+def iter_bits(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+class BitboardState(GameState):
+    """GameState com bitboards: mesma API (push_move/pop_move), outro backend de geração."""
+
+    def __init__(self, fen=START_FEN):
+        super().__init__(fen)
+        self.init_bitboards()
+
+    def init_bitboards(self):
+        self.bitboards = [0] * 16   # indexado pelo código da peça (tipo | cor)
+        self.occupancy = {'w': 0, 'b': 0}
+        for sq, p in enumerate(self.board):
+            if p != EMPTY:
+                self.bitboards[p] |= BIT[sq]
+                self.occupancy[PIECE_COLOR[p]] |= BIT[sq]
+        self.occupied = self.occupancy['w'] | self.occupancy['b']
+
+    def toggle_move(self, m, piece, captured):
+        # XOR é a própria inversa: a mesma rotina aplica (push) e desfaz (pop) a jogada nos bitboards.
+        # piece = peça que saiu da origem, captured = o que havia no destino antes da jogada.
+        bbs = self.bitboards
+        me = PIECE_COLOR[piece]
+        them = 'b' if me == 'w' else 'w'
+        from_sq = m & 63
+        to_sq = (m >> 6) & 63
+        flag = m & MOVE_FLAG_MASK
+        from_bit, to_bit = BIT[from_sq], BIT[to_sq]
+        placed = PROMO_PIECES[me][(m >> 12) & 3] if flag == MOVE_PROMOTION else piece
+        bbs[piece] ^= from_bit
+        bbs[placed] ^= to_bit
+        self.occupancy[me] ^= from_bit | to_bit
+        if captured != EMPTY:
+            bbs[captured] ^= to_bit
+            self.occupancy[them] ^= to_bit
+        elif flag == MOVE_ENPASSANT:
+            cap_bit = BIT[to_sq + 8] if me == 'w' else BIT[to_sq - 8]
+            bbs[PAWN | COLOR_BIT[them]] ^= cap_bit
+            self.occupancy[them] ^= cap_bit
+        elif flag == MOVE_CASTLING:
+            if to_sq % 8 == 6:
+                rook_bits = BIT[to_sq + 1] | BIT[to_sq - 1]
+            else:
+                rook_bits = BIT[to_sq - 2] | BIT[to_sq + 1]
+            bbs[ROOK | COLOR_BIT[me]] ^= rook_bits
+            self.occupancy[me] ^= rook_bits
+        self.occupied = self.occupancy['w'] | self.occupancy['b']
+
+    def push_move(self, m):
+        piece = self.board[m & 63]
+        captured = self.board[(m >> 6) & 63]
+        super().push_move(m)
+        self.toggle_move(m, piece, captured)
+
+    def pop_move(self):
+        if not self.ply:
+            return
+        base = (self.ply - 1) * UNDO_SIZE
+        m = self.undo[base]
+        piece = self.board[(m >> 6) & 63]
+        if m & MOVE_FLAG_MASK == MOVE_PROMOTION:
+            piece = PAWN | (piece & BLACK)
+        self.toggle_move(m, piece, self.undo[base + 1])
+        super().pop_move()
+
+def bb_attacked_with(state, sq, by_color, occ):
+    # como bb_is_square_attacked, mas com a ocupação dada (ex.: sem o rei, para testar a fuga dele)
+    bbs = state.bitboards
+    base = COLOR_BIT[by_color]
+    them = 'b' if by_color == 'w' else 'w'
+    if PAWN_ATTACKS[them][sq] & bbs[base | PAWN]:
+        return True
+    if KNIGHT_ATTACKS[sq] & bbs[base | KNIGHT]:
+        return True
+    if KING_ATTACKS[sq] & bbs[base | KING]:
+        return True
+    queens = bbs[base | QUEEN]
+    if bishop_attacks(sq, occ) & (bbs[base | BISHOP] | queens):
+        return True
+    if rook_attacks(sq, occ) & (bbs[base | ROOK] | queens):
+        return True
+    return False
+
+def bb_is_square_attacked(state, sq, by_color):
+    return bb_attacked_with(state, sq, by_color, state.occupied)
+
+def bb_attackers(state, sq, by_color, occ):
+    """Bitboard de todas as peças de by_color que atacam sq."""
+    bbs = state.bitboards
+    base = COLOR_BIT[by_color]
+    them = 'b' if by_color == 'w' else 'w'
+    queens = bbs[base | QUEEN]
+    return ((PAWN_ATTACKS[them][sq] & bbs[base | PAWN])
+            | (KNIGHT_ATTACKS[sq] & bbs[base | KNIGHT])
+            | (KING_ATTACKS[sq] & bbs[base | KING])
+            | (bishop_attacks(sq, occ) & (bbs[base | BISHOP] | queens))
+            | (rook_attacks(sq, occ) & (bbs[base | ROOK] | queens)))
+
+def bb_generate_pseudo_legal_moves(state):
+    return _bb_generate(state, BB_ALL, 0, None, False)
+
+def bb_generate_legal_moves(state, kinds=GEN_ALL):
+    bbs = state.bitboards
+    me = state.active_color
+    them = 'b' if me == 'w' else 'w'
+    ebase = COLOR_BIT[them]
+    king_sq = bbs[KING | COLOR_BIT[me]].bit_length() - 1
+    own = state.occupancy[me]
+    enemy = state.occupancy[them]
+    occ = state.occupied
+    checkers = bb_attackers(state, king_sq, them, occ)
+    # cravadas: deslizantes inimigas que veem o rei atravessando as nossas peças, com exatamente uma
+    # peça (nossa) no meio
+    queens = bbs[ebase | QUEEN]
+    snipers = ((rook_attacks(king_sq, enemy) & (bbs[ebase | ROOK] | queens))
+               | (bishop_attacks(king_sq, enemy) & (bbs[ebase | BISHOP] | queens)))
+    pinned = 0
+    pin_line = {}
+    for s in iter_bits(snipers):
+        between = BETWEEN[king_sq][s] & occ
+        if between and not between & (between - 1) and between & own:
+            pinned |= between
+            pin_line[between.bit_length() - 1] = BETWEEN[king_sq][s] | BIT[s]
+    if not checkers:
+        evasion = BB_ALL
+    elif checkers & (checkers - 1):
+        evasion = 0   # duplo xeque: só o rei
+    else:
+        evasion = BETWEEN[king_sq][checkers.bit_length() - 1] | checkers
+    return _bb_generate(state, evasion, pinned, pin_line, True, kinds)
+
+def _bb_generate(state, evasion, pinned, pin_line, legal, kinds=GEN_ALL):
+    # evasion: destinos permitidos às peças que não são o rei; pinned/pin_line: peças cravadas e a
+    # linha onde elas podem andar. Com legal=False (pseudo-legal) não há restrição nenhuma.
+    moves = []
+    bbs = state.bitboards
+    me = state.active_color
+    them = 'b' if me == 'w' else 'w'
+    base = COLOR_BIT[me]
+    own = state.occupancy[me]
+    enemy = state.occupancy[them]
+    occ = state.occupied
+    empty = ~occ & BB_ALL
+    not_own = ~own & BB_ALL
+    if kinds != GEN_ALL:
+        not_own &= enemy if kinds == GEN_CAPTURES else empty
+
+    if evasion:
+        # peões: empurrões e capturas calculados em bloco com shifts
+        pawns = bbs[base | PAWN]
+        if me == 'w':
+            push = 8
+            single = (pawns >> 8) & empty
+            double = ((single & RANK_3_BB) >> 8) & empty
+            cap_left = ((pawns & ~FILE_A_BB) >> 9) & enemy    # para a coluna da esquerda: from = to + 9
+            cap_right = ((pawns & ~FILE_H_BB) >> 7) & enemy   # from = to + 7
+            left_d, right_d = 9, 7
+            promo_rank = RANK_8_BB
+        else:
+            push = -8
+            single = (pawns << 8) & empty
+            double = ((single & RANK_6_BB) << 8) & empty
+            cap_left = ((pawns & ~FILE_A_BB) << 7) & enemy    # from = to - 7
+            cap_right = ((pawns & ~FILE_H_BB) << 9) & enemy   # from = to - 9
+            left_d, right_d = -7, -9
+            promo_rank = RANK_1_BB
+        if kinds == GEN_CAPTURES:
+            # promoção sem captura conta como "captura" (muda material); empurrões comuns não
+            single &= promo_rank
+            double = 0
+        elif kinds == GEN_QUIETS:
+            single &= ~promo_rank
+            cap_left = cap_right = 0
+        for targets, delta in ((single, push), (cap_left, left_d), (cap_right, right_d), (double, 2*push)):
+            targets &= evasion
+            for to in iter_bits(targets):
+                frm = to + delta
+                if pinned & BIT[frm] and not pin_line[frm] & BIT[to]:
+                    continue
+                if BIT[to] & promo_rank:
+                    for prom in PROMO_ORDER:
+                        moves.append(frm | (to << 6) | (prom << 12) | MOVE_PROMOTION)
+                else:
+                    moves.append(frm | (to << 6))
+        ep = state.enpassant
+        if ep != NO_SQUARE and kinds & GEN_CAPTURES:
+            for frm in iter_bits(PAWN_ATTACKS[them][ep] & pawns):
+                m = frm | (ep << 6) | MOVE_ENPASSANT
+                # en passant tira duas peças da fileira (xeque descoberto na horizontal): testa jogando
+                if not legal or is_legal_by_make(state, m):
+                    moves.append(m)
+
+        targets_mask = not_own & evasion
+        for frm in iter_bits(bbs[base | KNIGHT] & ~pinned):   # cavalo cravado nunca se mexe
+            for to in iter_bits(KNIGHT_ATTACKS[frm] & targets_mask):
+                moves.append(frm | (to << 6))
+        for kind, attacks in ((BISHOP, bishop_attacks), (ROOK, rook_attacks)):
+            for frm in iter_bits(bbs[base | kind]):
+                targets = attacks(frm, occ) & targets_mask
+                if pinned & BIT[frm]:
+                    targets &= pin_line[frm]
+                for to in iter_bits(targets):
+                    moves.append(frm | (to << 6))
+        for frm in iter_bits(bbs[base | QUEEN]):
+            targets = (bishop_attacks(frm, occ) | rook_attacks(frm, occ)) & targets_mask
+            if pinned & BIT[frm]:
+                targets &= pin_line[frm]
+            for to in iter_bits(targets):
+                moves.append(frm | (to << 6))
+
+    for frm in iter_bits(bbs[base | KING]):
+        # sem o rei na ocupação, para ele não "se esconder" atrás de si mesmo na linha de uma deslizante
+        occ_no_king = occ ^ BIT[frm]
+        for to in iter_bits(KING_ATTACKS[frm] & not_own):
+            if not legal or not bb_attacked_with(state, to, them, occ_no_king):
+                moves.append(frm | (to << 6))
+        # roque: casas entre rei e torre vazias e rei não sai, passa ou chega em casa atacada
+        if not kinds & GEN_QUIETS:
+            continue
+        if me == 'w':
+            if state.castling & CASTLE_WK and not occ & (BIT[61] | BIT[62]) \
+                    and not any(bb_is_square_attacked(state, s, them) for s in (60, 61, 62)):
+                moves.append(frm | ((frm + 2) << 6) | MOVE_CASTLING)
+            if state.castling & CASTLE_WQ and not occ & (BIT[57] | BIT[58] | BIT[59]) \
+                    and not any(bb_is_square_attacked(state, s, them) for s in (60, 59, 58)):
+                moves.append(frm | ((frm - 2) << 6) | MOVE_CASTLING)
+        else:
+            if state.castling & CASTLE_BK and not occ & (BIT[5] | BIT[6]) \
+                    and not any(bb_is_square_attacked(state, s, them) for s in (4, 5, 6)):
+                moves.append(frm | ((frm + 2) << 6) | MOVE_CASTLING)
+            if state.castling & CASTLE_BQ and not occ & (BIT[1] | BIT[2] | BIT[3]) \
+                    and not any(bb_is_square_attacked(state, s, them) for s in (4, 3, 2)):
+                moves.append(frm | ((frm - 2) << 6) | MOVE_CASTLING)
+    return moves
+
+def bb_filter_legal_moves(state, moves):
+    legal = []
+    for m in moves:
+        state.push_move(m)
+        # quem acabou de jogar é o oposto de active_color; o rei dele não pode estar atacado
+        king_bb = state.bitboards[KING | (WHITE if state.active_color == 'b' else BLACK)]
+        ok = king_bb and not bb_is_square_attacked(state, king_bb.bit_length() - 1, state.active_color)
+        state.pop_move()
+        if ok:
+            legal.append(m)
+    return legal
+
+BACKENDS = {'mailbox': GameState, 'bitboard': BitboardState}
+
+def new_state(fen=START_FEN, backend='mailbox'):
+    """Cria um GameState do backend escolhido ('mailbox' ou 'bitboard')."""
+    return BACKENDS[backend](fen)
+
 # ----------------------------
 # Avaliação
 # ----------------------------
-PIECE_VALUES = {'P':100, 'N':320, 'B':330, 'R':500, 'Q':900, 'K':20000,
-                'p':-100, 'n':-320, 'b':-330, 'r':-500, 'q':-900, 'k':-20000}
+# valor com sinal (brancas +, pretas -), indexado pelo código da peça
+PIECE_VALUES = [0] * 16
+for _kind, _value in ((PAWN, 100), (KNIGHT, 320), (BISHOP, 330), (ROOK, 500), (QUEEN, 900), (KING, 20000)):
+    PIECE_VALUES[_kind | WHITE] = _value
+    PIECE_VALUES[_kind | BLACK] = -_value
+SEE_VALUES = [abs(v) for v in PIECE_VALUES]   # sem sinal, para a SEE
 
 # piece-square tables small heuristic (white perspective). We'll use symmetrical for black.
 PST = {
-    'P': [
+    PAWN: [
          0,  0,  0,  0,  0,  0,  0,  0,
          5, 10, 10,-20,-20, 10, 10,  5,
          5, -5,-10,  0,  0,-10, -5,  5,
@@ -500,7 +1595,7 @@ PST = {
         50, 50, 50, 50, 50, 50, 50, 50,
          0,  0,  0,  0,  0,  0,  0,  0
     ],
-    'N': [
+    KNIGHT: [
         -50,-40,-30,-30,-30,-30,-40,-50,
         -40,-20,  0,  0,  0,  0,-20,-40,
         -30,  0, 10, 15, 15, 10,  0,-30,
@@ -510,7 +1605,7 @@ PST = {
         -40,-20,  0,  5,  5,  0,-20,-40,
         -50,-40,-30,-30,-30,-30,-40,-50
     ],
-    'B': [
+    BISHOP: [
         -20,-10,-10,-10,-10,-10,-10,-20,
         -10,  5,  0,  0,  0,  0,  5,-10,
         -10, 10, 10, 10, 10, 10, 10,-10,
@@ -520,7 +1615,7 @@ PST = {
         -10,  0,  0,  0,  0,  0,  0,-10,
         -20,-10,-10,-10,-10,-10,-10,-20
     ],
-    'R': [
+    ROOK: [
          0,  0,  0,  5,  5,  0,  0,  0,
         -5,  0,  0,  0,  0,  0,  0, -5,
         -5,  0,  0,  0,  0,  0,  0, -5,
@@ -530,7 +1625,7 @@ PST = {
          5, 10, 10, 10, 10, 10, 10,  5,
          0,  0,  0,  0,  0,  0,  0,  0
     ],
-    'Q': [
+    QUEEN: [
         -20,-10,-10, -5, -5,-10,-10,-20,
         -10,  0,  0,  0,  0,  0,  0,-10,
         -10,  0,  5,  5,  5,  5,  0,-10,
@@ -540,7 +1635,7 @@ PST = {
         -10,  0,  5,  0,  0,  0,  0,-10,
         -20,-10,-10, -5, -5,-10,-10,-20
     ],
-    'K': [
+    KING: [
         -30,-40,-40,-50,-50,-40,-40,-30,
         -30,-40,-40,-50,-50,-40,-40,-30,
         -30,-40,-40,-50,-50,-40,-40,-30,
@@ -552,95 +1647,617 @@ PST = {
     ]
 }
 
+# PIECE_SQUARE[p][sq]: tabela já espelhada e com sinal para cada código de peça (vazio = zeros)
+PIECE_SQUARE = [[0] * 64 for _ in range(16)]
+for _kind, _tbl in PST.items():
+    for _sq in range(64):
+        PIECE_SQUARE[_kind | WHITE][_sq] = _tbl[_sq]
+        PIECE_SQUARE[_kind | BLACK][_sq] = -_tbl[63 - _sq]
+del _kind, _value, _tbl, _sq
+
 def pst_value(piece, sq):
-    if piece == '.': return 0
-    key = piece.upper()
-    tbl = PST.get(key)
-    if tbl is None: return 0
-    # for white, table index = sq; for black, mirror vertically
-    if piece.isupper():
-        return tbl[sq]
-    else:
-        return -tbl[63 - sq]
+    return PIECE_SQUARE[piece][sq]
 
 def evaluate(state: GameState):
-    score = 0
-    for i, p in enumerate(state.board):
-        if p == '.': continue
-        score += PIECE_VALUES.get(p, 0)
-        score += pst_value(p, i)
-    # perspective: positive -> white advantage; we will return score for side to move as perspective
-    return score
+    """Material + PST, em O(1) a partir dos termos que o GameState mantém em push/pop.
+
+    Negamax: o valor é do ponto de vista de quem joga (positivo = bom para o lado da vez).
+    """
+    material = state.material
+    score = material['w'] - material['b'] + state.pst_score
+    return score if state.active_color == 'w' else -score
 
 # ----------------------------
 # Search: Minimax + Alpha-Beta + Iterative Deepening + TT
 # ----------------------------
 INF = 10**9
 
+# ----------------------------
+# Transposition table
+# ----------------------------
+# Tamanho fixo, em dois array('Q') pré-alocados: a chave zobrist inteira e um dado empacotado
+#   bits 0-15 jogada, 16-23 profundidade, 24-25 flag, 26-31 geração, 32-63 score + 2^31.
+# Cada bucket (índice = hash & máscara) tem dois slots: o 0 guarda a entrada mais profunda (ou
+# qualquer uma de busca antiga), o 1 é "sempre substitui".
+TT_EXACT, TT_LOWER, TT_UPPER = 1, 2, 3   # 0 = slot vazio
+TT_ENTRY_BYTES = 16
+TT_BUCKET = 2
+TT_SCORE_OFFSET = 1 << 31
+TT_AGE_MASK = 63
+TT_QS_DEPTH = 0   # entradas da quiescence: só ocupam slots vazios, de quiescence ou de busca antiga
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        buckets = max(1, size_mb * 1024 * 1024 // (TT_ENTRY_BYTES * TT_BUCKET))
+        buckets = 1 << (buckets.bit_length() - 1)   # potência de 2: índice por máscara
+        self.size_mb = size_mb
+        self.mask = buckets - 1
+        self.allocate(buckets * TT_BUCKET)
+        self.age = 0
+        self.reset_stats()
+
+    def allocate(self, n):
+        self.keys = array('Q', bytes(8 * n))
+        self.data = array('Q', bytes(8 * n))
+
+    def clear(self):
+        self.allocate(len(self.keys))
+        self.age = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = self.hits = self.stores = self.collisions = 0
+
+    def new_search(self):
+        """Avança a geração: entradas de buscas anteriores passam a ser as primeiras a sair."""
+        self.age = (self.age + 1) & TT_AGE_MASK
+
+    def probe(self, key):
+        """(depth, score, flag, move) da posição, ou None."""
+        self.probes += 1
+        i = (key & self.mask) * TT_BUCKET
+        keys = self.keys
+        if keys[i] != key:
+            i += 1
+            if keys[i] != key:
+                return None
+        d = self.data[i]
+        if not d:
+            return None
+        self.hits += 1
+        return (d >> 16) & 0xFF, (d >> 32) - TT_SCORE_OFFSET, (d >> 24) & 3, d & 0xFFFF
+
+    def store(self, key, depth, score, flag, move):
+        i = (key & self.mask) * TT_BUCKET
+        keys = self.keys
+        data = self.data
+        if keys[i] != key and keys[i + 1] == key:
+            i += 1   # a posição já está no slot 1: atualiza lá (nada de cópia velha no outro)
+        old = data[i]
+        if keys[i] == key:
+            # mesma posição: um limite mais raso desta busca não apaga o mais profundo (só EXACT,
+            # e nunca um da quiescence)
+            if (old and (flag != TT_EXACT or depth == TT_QS_DEPTH)
+                    and (old >> 26) & TT_AGE_MASK == self.age and depth < (old >> 16) & 0xFF):
+                return
+        else:
+            if old and (old >> 26) & TT_AGE_MASK == self.age and depth < (old >> 16) & 0xFF:
+                i += 1   # o slot de profundidade é mais valioso: vai para o "sempre substitui"
+                old = data[i]
+                if (depth == TT_QS_DEPTH and old and (old >> 26) & TT_AGE_MASK == self.age
+                        and (old >> 16) & 0xFF):
+                    return   # a quiescence não empurra para fora entradas da busca principal
+            if old:
+                self.collisions += 1
+        if not move and keys[i] == key:
+            move = old & 0xFFFF   # sem jogada nova (fail-low): mantém a antiga
+        self.stores += 1
+        keys[i] = key
+        data[i] = (move | (min(depth, 255) << 16) | (flag << 24) | (self.age << 26)
+                   | ((score + TT_SCORE_OFFSET) << 32))
+
+    def hashfull(self):
+        """Ocupação em permil (entradas da geração atual numa amostra de até 1000 slots)."""
+        data = self.data
+        n = min(1000, len(data))
+        age = self.age
+        used = sum(1 for j in range(n) if data[j] and (data[j] >> 26) & TT_AGE_MASK == age)
+        return used * 1000 // n
+
+    def stats(self):
+        return {'size_mb': self.size_mb, 'entries': len(self.keys), 'probes': self.probes,
+                'hits': self.hits, 'stores': self.stores, 'collisions': self.collisions,
+                'hashfull': self.hashfull()}
+
+# TT em multiprocessing.shared_memory para o Lazy SMP: vários processos lêem e escrevem sem trava.
+# A chave guardada é zobrist ^ dado; uma escrita rasgada por outro processo (chave de uma entrada,
+# dado de outra) não confere no probe e vira simplesmente um miss.
+class SharedTranspositionTable(TranspositionTable):
+    def __init__(self, size_mb=16, name=None):
+        # name: abre o segmento já criado por outro processo; sem name, cria um novo
+        self.keys = self.data = None
+        self.shm = shared_memory.SharedMemory(name=name) if name else None
+        self.owner = name is None
+        try:
+            super().__init__(size_mb)
+        except ValueError:
+            self.shm.close()
+            raise
+
+    def allocate(self, n):
+        if self.shm is not None and self.shm.size < 16 * n:
+            if not self.owner:
+                # um segmento privado novo deixaria este processo fora da tabela compartilhada
+                raise ValueError(f"shared TT {self.shm.name} has {self.shm.size} bytes, "
+                                 f"{16 * n} needed for {self.size_mb} MB")
+            self.close()
+        if self.shm is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=16 * n)
+            self.owner = True
+        buf = self.shm.buf
+        self.keys = buf[:8 * n].cast('Q')
+        self.data = buf[8 * n:16 * n].cast('Q')
+
+    def clear(self):
+        n = len(self.keys)
+        self.shm.buf[:16 * n] = bytes(16 * n)
+        self.age = 0
+        self.reset_stats()
+
+    def close(self):
+        """Solta o segmento (e o apaga, se foi este processo que o criou)."""
+        if self.shm is None:
+            return
+        if self.keys is not None:
+            self.keys.release()
+            self.data.release()
+            self.keys = self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+    def probe(self, key):
+        self.probes += 1
+        i = (key & self.mask) * TT_BUCKET
+        keys = self.keys
+        data = self.data
+        d = data[i]
+        if keys[i] ^ d != key:
+            i += 1
+            d = data[i]
+            if keys[i] ^ d != key:
+                return None
+        if not d:
+            return None
+        self.hits += 1
+        return (d >> 16) & 0xFF, (d >> 32) - TT_SCORE_OFFSET, (d >> 24) & 3, d & 0xFFFF
+
+    def store(self, key, depth, score, flag, move):
+        i = (key & self.mask) * TT_BUCKET
+        keys = self.keys
+        data = self.data
+        if keys[i] ^ data[i] != key and keys[i + 1] ^ data[i + 1] == key:
+            i += 1
+        old = data[i]
+        if keys[i] ^ old == key:
+            if (old and (flag != TT_EXACT or depth == TT_QS_DEPTH)
+                    and (old >> 26) & TT_AGE_MASK == self.age and depth < (old >> 16) & 0xFF):
+                return
+        else:
+            if old and (old >> 26) & TT_AGE_MASK == self.age and depth < (old >> 16) & 0xFF:
+                i += 1
+                old = data[i]
+                if (depth == TT_QS_DEPTH and old and (old >> 26) & TT_AGE_MASK == self.age
+                        and (old >> 16) & 0xFF):
+                    return
+            if old and keys[i] ^ old != key:
+                self.collisions += 1
+        if not move and keys[i] ^ old == key:
+            move = old & 0xFFFF
+        self.stores += 1
+        d = (move | (min(depth, 255) << 16) | (flag << 24) | (self.age << 26)
+             | ((score + TT_SCORE_OFFSET) << 32))
+        data[i] = d
+        keys[i] = key ^ d
+
+# Ordenação das jogadas quietas: duas killers por ply e história por lado/origem/destino
+MAX_PLY = 128
+HISTORY_MAX = 1 << 20    # passou disso, a tabela inteira é dividida por 2
+ORDER_HASH = INF
+ORDER_GOOD_CAPTURE = 1000000   # capturas que não perdem material e promoções (+ MVV-LVA)
+ORDER_KILLER = 900000          # killer 0; a killer 1 fica logo abaixo
+
+def capture_score(board, m):
+    # MVV-LVA, com promoção valendo uma dama a mais (en passant: peão x peão, saldo 0). Promoção
+    # e MVV-LVA negativo passam pela SEE (needs_see): numa casa defendida a peça nova se perde
+    score = 0
+    captured = board[(m >> 6) & 63]
+    if captured != EMPTY:
+        score += abs(PIECE_VALUES[captured]) - abs(PIECE_VALUES[board[m & 63]])
+    if m & MOVE_FLAG_MASK == MOVE_PROMOTION:
+        score += 900
+    return score
+
+def needs_see(score, m):
+    return score < 0 or m & MOVE_FLAG_MASK == MOVE_PROMOTION
+
+def is_quiet(state, m):
+    return (state.board[(m >> 6) & 63] == EMPTY
+            and m & MOVE_FLAG_MASK != MOVE_PROMOTION and m & MOVE_FLAG_MASK != MOVE_ENPASSANT)
+
+# Mate vale -INF + plies desde a raiz para quem leva mate. Na TT fica relativo ao nó (plies até o
+# mate a partir dali), então a mesma entrada serve quando a posição aparece em outro ply.
+def score_to_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+def score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+# Busca seletiva (cada parte pode ser desligada no Searcher para medir o ganho)
+MATE_BOUND = INF - 1000          # |score| acima disso é mate: não podar com base nele
+NULL_MIN_DEPTH = 3
+NULL_REDUCTION = 2               # R; +1 a partir de profundidade 7
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3                # as primeiras jogadas nunca são reduzidas
+FUTILITY_MARGIN = (0, 200, 500)  # por profundidade restante (1 e 2)
+REVERSE_FUTILITY_MARGIN = 120    # por ply de profundidade restante, até 3
+ASPIRATION_WINDOW = 50           # meia-largura inicial da janela em volta do score anterior
+ASPIRATION_MIN_DEPTH = 3
+
+# Limites: o relógio (monotônico) e o limite de nós são conferidos a cada POLL_INTERVAL nós, não
+# em todo nó. Ao estourar o limite duro (tempo, nós ou stop() de fora) a busca sai por exceção e a
+# iteração incompleta é descartada; o limite mole só impede começar outra iteração.
+POLL_INTERVAL = 1024
+SOFT_TIME_FRACTION = 0.5   # sem soft_time: não começa iteração nova depois de metade do tempo
+
+class SearchAborted(Exception):
+    pass
+
 class Searcher:
-    def __init__(self):
-        self.nodes = 0
+    def __init__(self, hash_mb=16):
+        self.nodes = 0            # nós da busca atual (alphabeta + quiescence)
         self.start_time = 0
-        self.time_limit = None
+        self.time_limit = None    # limite duro (s): aborta no meio da iteração
+        self.soft_time = None     # limite mole (s): não começa outra iteração
+        self.node_limit = None
+        self.deadline = None
+        self.next_poll = POLL_INTERVAL
+        self.stop_requested = False   # stop() de outra thread (UCI)
+        self.stop_event = None    # multiprocessing.Event: stop vindo de outro processo (Lazy SMP)
+        self.helper = 0           # índice do worker no Lazy SMP; 0 = busca principal
+        self.on_iteration = None  # callback(searcher, depth, score) a cada iteração completa (UCI info)
+        self.stopped = False      # a última busca foi abortada por algum limite
+        self.depth_reached = 0
         self.best_line = []
-        self.tt = {}  # zobrist -> (depth, score, flag, best_move)
-        # flags: 'EXACT', 'LOWER', 'UPPER'
+        self.pv_moves = {}   # zobrist -> jogada da PV da iteração anterior
+        self.tt = TranspositionTable(hash_mb)
+        self.root_ply = 0
+        self.game_ply = None      # plies da partida na raiz da busca anterior (alinha as killers)
+        self.pondering = False    # busca sem limite de tempo até ponderhit() ou stop()
+        self.started = threading.Event()   # setado quando search() já zerou stop/ponder
+        self.ponder_limits = (None, None)
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        # history[lado*4096 + (m & 4095)]: lado 0 = brancas, 1 = pretas; m & 4095 = origem | destino << 6
+        self.history = [0] * (2 * 4096)
+        self.cutoffs = 0          # nós que cortaram por beta
+        self.first_cutoffs = 0    # ... já na primeira jogada tentada
+        self.null_move = True
+        self.lmr = True
+        self.futility = True
+        self.reverse_futility = True
+
+    def new_ordering(self, state):
+        # entre buscas a história perde metade do peso (envelhece como a geração da TT) e as
+        # killers andam junto com a partida: a do ply k+2 da busca anterior é a do ply k agora
+        game_ply = 2 * (state.fullmove - 1) + (state.active_color == 'b')
+        shift = game_ply - self.game_ply if self.game_ply is not None else MAX_PLY
+        if 0 <= shift < MAX_PLY:
+            self.killers = self.killers[shift:] + [[0, 0] for _ in range(shift)]
+        else:
+            self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.game_ply = game_ply
+        self.history = [h >> 1 for h in self.history]
+        self.cutoffs = self.first_cutoffs = 0
+
+    def update_quiet_cutoff(self, state, m, depth, tried):
+        ply = state.ply - self.root_ply
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != m:
+                killers[1] = killers[0]
+                killers[0] = m
+        history = self.history
+        side = 4096 if state.active_color == 'b' else 0
+        history[side + (m & 4095)] += depth * depth
+        # as quietas tentadas antes e que não cortaram perdem o mesmo tanto
+        for q in tried:
+            i = side + (q & 4095)
+            history[i] = max(0, history[i] - depth * depth)
+        if history[side + (m & 4095)] > HISTORY_MAX:
+            self.history = [h >> 1 for h in history]
+
+    def first_cutoff_rate(self):
+        return self.first_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def reset(self):
+        """Esquece tudo o que vem de buscas anteriores (TT, killers, história)."""
+        self.tt.clear()
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [0] * (2 * 4096)
+        self.game_ply = None
+        self.pv_moves = {}
 
-    def time_exceeded(self):
-        if self.time_limit is None: return False
-        return (time.time() - self.start_time) >= self.time_limit
+    def search_fixed(self, state, depth=None, nodes=None):
+        """Busca reprodutível: só profundidade e/ou limite de nós, sem relógio, a partir de tabelas
+        limpas. A mesma posição dá sempre a mesma jogada, o mesmo score e o mesmo número de nós."""
+        self.reset()
+        return self.search(state, max_depth=depth or MAX_PLY, time_limit=None, node_limit=nodes)
 
-    def order_moves(self, state, moves):
-        # simple move ordering: captures first (by value), promotions, else random
+    def stop(self):
+        """Pede para a busca em andamento parar (ela sai no próximo poll)."""
+        self.stop_requested = True
+
+    def ponderhit(self):
+        """O adversário jogou a jogada esperada: a busca em ponder vira uma busca normal. O limite
+        duro conta a partir de agora; o mole inclui o tempo já pensado, então um ponder que já
+        passou dele responde ao fim da iteração em andamento."""
+        self.pondering = False
+        time_limit, soft_time = self.ponder_limits
+        self.deadline = time.monotonic() + time_limit if time_limit is not None else None
+        self.soft_time = soft_time
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def poll(self):
+        """Chamado quando nodes chega em next_poll; levanta SearchAborted se algum limite acabou."""
+        if self.stop_requested or (self.stop_event is not None and self.stop_event.is_set()):
+            raise SearchAborted
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchAborted
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise SearchAborted
+        self.next_poll = self.nodes + POLL_INTERVAL
+        if self.node_limit is not None and self.next_poll > self.node_limit:
+            self.next_poll = self.node_limit   # para exatamente no limite de nós
+
+    def order_moves(self, state, moves, hash_move=0):
+        # hash move (PV/TT) first, then good captures/promotions, killers, quiets by history,
+        # and losing captures last
+        board = state.board
+        ply = state.ply - self.root_ply
+        killer0, killer1 = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        history = self.history
+        side = 4096 if state.active_color == 'b' else 0
         scored = []
         for m in moves:
-            score = 0
-            if m.captured != '.':
-                score += abs(PIECE_VALUES.get(m.captured, 0)) - abs(PIECE_VALUES.get(m.piece, 0))
-            if m.promotion:
-                score += 900
-            # prefer center moves lightly
-            file = file_of(m.to_sq)
-            rank = rank_of(m.to_sq)
+            if m == hash_move:
+                scored.append((ORDER_HASH, m))
+                continue
+            to_sq = (m >> 6) & 63
+            flag = m & MOVE_FLAG_MASK
+            if board[to_sq] != EMPTY or flag == MOVE_PROMOTION or flag == MOVE_ENPASSANT:
+                score = capture_score(board, m)
+                if not needs_see(score, m):
+                    score += ORDER_GOOD_CAPTURE
+                else:
+                    # MVV-LVA negativo (peça maior captura menor) ou promoção: a SEE decide se perde
+                    exchange = see(state, m)
+                    score = score + ORDER_GOOD_CAPTURE if exchange >= 0 else exchange
+                scored.append((score, m))
+                continue
+            if m == killer0:
+                scored.append((ORDER_KILLER, m))
+                continue
+            if m == killer1:
+                scored.append((ORDER_KILLER - 1, m))
+                continue
+            # quietas: história, e o centro só desempata
+            file = file_of(to_sq)
+            rank = rank_of(to_sq)
             center_dist = abs(file-3.5)+abs(rank-3.5)
-            score -= center_dist
-            scored.append((score, m))
+            scored.append((history[side + (m & 4095)] - center_dist, m))
         scored.sort(key=lambda x: -x[0])
         return [m for _, m in scored]
 
-    def search(self, state: GameState, max_depth=4, time_limit=2.0):
-        self.start_time = time.time()
+    def pick_moves(self, state, hash_move=0):
+        """Gera as jogadas legais em estágios, só quando o anterior acaba:
+
+        hash move -> capturas que não perdem material (SEE >= 0) e promoções -> killers ->
+        quietas pela história -> capturas perdedoras, da menos ruim para a pior. Um corte no
+        hash move ou numa captura nunca paga a geração nem a ordenação das quietas. Hash move
+        e killers vêm de outras posições, então são conferidos (is_pseudo_legal + make/unmake)
+        antes de sair.
+        """
+        if hash_move and is_pseudo_legal(state, hash_move) and is_legal_by_make(state, hash_move):
+            yield hash_move
+        board = state.board
+        scored = [(capture_score(board, m), m) for m in generate_legal_moves(state, GEN_CAPTURES)
+                  if m != hash_move]
+        scored.sort(key=lambda x: -x[0])
+        losing = []
+        for score, m in scored:
+            if needs_see(score, m):
+                exchange = see(state, m)
+                if exchange < 0:
+                    losing.append((exchange, m))
+                    continue
+            yield m
+        ply = state.ply - self.root_ply
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        done = [hash_move]
+        for k in killers:
+            if k and k not in done and is_pseudo_legal(state, k) and is_quiet(state, k) \
+                    and is_legal_by_make(state, k):
+                done.append(k)
+                yield k
+        history = self.history
+        side = 4096 if state.active_color == 'b' else 0
+        quiets = []
+        for m in generate_legal_moves(state, GEN_QUIETS):
+            if m not in done:
+                to_sq = (m >> 6) & 63
+                center_dist = abs(file_of(to_sq)-3.5)+abs(rank_of(to_sq)-3.5)
+                quiets.append((history[side + (m & 4095)] - center_dist, m))
+        quiets.sort(key=lambda x: -x[0])
+        for _, m in quiets:
+            yield m
+        losing.sort(key=lambda x: -x[0])
+        for _, m in losing:
+            yield m
+
+    def search(self, state: GameState, max_depth=4, time_limit=2.0, node_limit=None, soft_time=None,
+               ponder=False):
+        """Aprofundamento iterativo até max_depth, time_limit (duro, s), soft_time ou node_limit.
+        ponder: sem relógio até ponderhit() (os limites passam a valer a partir dali)."""
+        # stop()/ponderhit() de antes desta busca não valem para ela; quem roda a busca numa
+        # thread espera started antes de mandar stop ou ponderhit
+        self.stop_requested = False
+        self.pondering = ponder
+        self.started.set()
+        self.start_time = time.monotonic()
         self.time_limit = time_limit
+        if soft_time is None and time_limit is not None:
+            soft_time = time_limit * SOFT_TIME_FRACTION
+        self.soft_time = soft_time
+        self.deadline = self.start_time + time_limit if time_limit is not None else None
+        self.ponder_limits = (time_limit, soft_time)
+        if self.pondering:
+            self.deadline = self.soft_time = None
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.next_poll = POLL_INTERVAL if node_limit is None else min(POLL_INTERVAL, node_limit)
+        self.stopped = False
+        self.depth_reached = 0
+        self.tt.new_search()
+        self.new_ordering(state)
+        self.root_ply = state.ply
+        # pv_moves fica: a PV da busca anterior (por zobrist) ordena a linha esperada nesta
+        if not generate_legal_moves(state):
+            # mate ou afogamento na raiz: não há o que aprofundar
+            self.best_line = []
+            self.stop_requested = False
+            return None, (-INF if in_check(state) else 0)
         best_move = None
         best_score = -INF
         for depth in range(1, max_depth+1):
-            self.nodes = 0
-            score, move = self.alphabeta_root(state, depth)
-            if not self.time_exceeded():
-                best_move, best_score = move, score
-                self.best_line = [move]
-                # optional: could store PV via TT
-            else:
+            if self.helper & 1 and depth & 1 and depth < max_depth:
+                continue   # helpers ímpares só fazem as profundidades pares: ficam defasados
+            try:
+                score, move = self.aspiration(state, depth, best_score)
+            except SearchAborted:
+                # a iteração incompleta não vale: volta o estado para a raiz e fica com a anterior
+                state.unwind(self.root_ply)
+                self.stopped = True
                 break
+            best_move, best_score = move, score
+            self.depth_reached = depth
+            self.best_line = self.extract_pv(state, depth)
+            # a PV desta iteração é tentada primeiro na próxima
+            self.pv_moves = self.pv_keys(state, self.best_line)
+            if self.on_iteration is not None:
+                self.on_iteration(self, depth, score)
+            if self.stop_requested or (self.stop_event is not None and self.stop_event.is_set()):
+                break
+            if self.soft_time is not None and self.elapsed() >= self.soft_time:
+                break
+        self.stop_requested = False
+        if best_move is None:
+            # abortou antes de terminar a profundidade 1: qualquer jogada legal é melhor que nenhuma
+            moves = self.order_moves(state, generate_legal_moves(state))
+            if moves:
+                best_move = moves[0]
+                best_score = evaluate(state)
+                self.best_line = [best_move]
         return best_move, best_score
 
-    def alphabeta_root(self, state, depth):
-        alpha = -INF
-        beta = INF
+    def extract_pv(self, state, max_len):
+        """Segue as jogadas guardadas na TT a partir da raiz (conferindo legalidade) até max_len."""
+        line = []
+        seen = set()
+        while len(line) < max_len:
+            key = state.current_zobrist
+            entry = self.tt.probe(key)
+            if entry is None or not entry[3] or key in seen:
+                break
+            m = entry[3]
+            if m not in generate_legal_moves(state):
+                break   # colisão de índice/chave: a entrada não é desta posição
+            seen.add(key)
+            state.push_move(m)
+            line.append(m)
+        for _ in line:
+            state.pop_move()
+        return line
+
+    def pv_keys(self, state, line):
+        keys = {}
+        for m in line:
+            keys[state.current_zobrist] = m
+            state.push_move(m)
+        for _ in line:
+            state.pop_move()
+        return keys
+
+    def aspiration(self, state, depth, prev_score):
+        """Raiz com janela estreita em volta do score da iteração anterior; abre a cada falha."""
+        if depth < ASPIRATION_MIN_DEPTH or abs(prev_score) >= MATE_BOUND:
+            return self.alphabeta_root(state, depth, -INF, INF)
+        window = ASPIRATION_WINDOW
+        alpha, beta = prev_score - window, prev_score + window
+        while True:
+            score, move = self.alphabeta_root(state, depth, alpha, beta)
+            if score <= alpha:
+                alpha = max(score - window, -INF)   # fail-low: abre para baixo
+            elif score >= beta:
+                beta = min(score + window, INF)     # fail-high: abre para cima
+            else:
+                return score, move
+            window *= 4
+
+    def alphabeta_root(self, state, depth, alpha=-INF, beta=INF):
+        # PVS: janela cheia só para a primeira jogada; as outras são provadas com janela nula e
+        # re-buscadas se passarem de alpha
+        alpha_orig = alpha
+        best_score = -INF
         best_move = None
-        moves = generate_pseudo_legal_moves(state)
-        moves = filter_legal_moves(state, moves)
-        moves = self.order_moves(state, moves)
-        for m in moves:
+        moves = generate_legal_moves(state)
+        moves = self.order_moves(state, moves, self.pv_moves.get(state.current_zobrist, 0))
+        for i, m in enumerate(moves):
             state.push_move(m)
-            val = -self.alphabeta(state, depth-1, -beta, -alpha)
+            if i == 0:
+                val = -self.alphabeta(state, depth-1, -beta, -alpha)
+            else:
+                val = -self.alphabeta(state, depth-1, -alpha-1, -alpha)
+                if alpha < val < beta:
+                    val = -self.alphabeta(state, depth-1, -beta, -alpha)
             state.pop_move()
-            if self.time_exceeded():
-                break
+            if val > best_score:
+                best_score = val
+                best_move = m
             if val > alpha:
                 alpha = val
-                best_move = m
-        return alpha, best_move
+            if alpha >= beta:
+                break
+        if best_move is not None:
+            if best_score <= alpha_orig:
+                self.tt.store(state.current_zobrist, depth, best_score, TT_UPPER, 0)
+            else:
+                flag = TT_LOWER if best_score >= beta else TT_EXACT
+                self.tt.store(state.current_zobrist, depth, best_score, flag, best_move)
+        return best_score, best_move
 
     # def alphabeta(self, state, depth, alpha, beta):
     #     self.nodes += 1
@@ -702,88 +2319,557 @@ class Searcher:
     #     self.tt[zob] = (depth, best_score, flag, best_move)
     #     return best_score
 
-    def alphabeta(self, state, depth, alpha, beta):
-    self.nodes += 1
-    if self.time_exceeded():
-        return 0
-    # check repetition? omitted for simplicity
-    # transposition lookup
-    zob = state.current_zobrist
-    if zob in self.tt:
-        entry = self.tt[zob]
-        e_depth, e_score, e_flag, e_move = entry
-        if e_depth >= depth:
-            if e_flag == 'EXACT':
-                return e_score
-            elif e_flag == 'LOWER' and e_score > alpha:
-                alpha = e_score
-            elif e_flag == 'UPPER' and e_score < beta:
-                beta = e_score
+    def alphabeta(self, state, depth, alpha, beta, allow_null=True):
+        self.nodes += 1
+        if self.nodes >= self.next_poll:
+            self.poll()
+        # check repetition? omitted for simplicity
+        # transposition lookup
+        zob = state.current_zobrist
+        ply = state.ply - self.root_ply
+        entry = self.tt.probe(zob)
+        hash_move = self.pv_moves.get(zob, 0)
+        if entry is not None:
+            e_depth, e_score, e_flag, e_move = entry
+            e_score = score_from_tt(e_score, ply)
+            hash_move = hash_move or e_move
+            if e_depth >= depth:
+                if e_flag == TT_EXACT:
+                    return e_score
+                elif e_flag == TT_LOWER and e_score > alpha:
+                    alpha = e_score
+                elif e_flag == TT_UPPER and e_score < beta:
+                    beta = e_score
+                if alpha >= beta:
+                    return e_score
+        if depth == 0:
+            return quiescence(self, state, alpha, beta)
+        me = state.active_color
+        checked = in_check(state)
+        static_eval = evaluate(state)
+        # podas só em nós de janela nula (fora da PV) e longe de scores de mate
+        prunable = beta - alpha == 1 and abs(beta) < MATE_BOUND and abs(alpha) < MATE_BOUND
+        # reverse futility: perto da folha e com folga grande sobre beta, o lado da vez não vai cair
+        if (self.reverse_futility and not checked and prunable and depth <= 3
+                and static_eval - REVERSE_FUTILITY_MARGIN * depth >= beta):
+            return static_eval
+        # null move: se nem passando a vez o adversário alcança beta, corta. Só com peças além de
+        # peões (zugzwang), e o corte é confirmado por uma busca reduzida sem null move
+        if (self.null_move and allow_null and not checked and prunable and depth >= NULL_MIN_DEPTH
+                and static_eval >= beta and state.has_non_pawn_material(me)):
+            r = NULL_REDUCTION + (1 if depth >= 7 else 0)
+            state.push_null()
+            score = -self.alphabeta(state, depth - 1 - r, -beta, -beta + 1, False)
+            state.pop_null()
+            if score >= beta:
+                verified = self.alphabeta(state, depth - r, beta - 1, beta, False)
+                if verified >= beta:
+                    return beta
+        # futility: na fronteira, quietas não levantam uma avaliação muito abaixo de alpha
+        futile = (self.futility and not checked and prunable and depth < len(FUTILITY_MARGIN)
+                  and static_eval + FUTILITY_MARGIN[depth] <= alpha)
+        ply = state.ply - self.root_ply
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        best_score = -INF
+        best_move = None
+        alpha_orig = alpha  # Adicionada esta linha para definir alpha_orig
+        quiets_tried = []
+        i = -1
+        for i, m in enumerate(self.pick_moves(state, hash_move)):
+            quiet = is_quiet(state, m)
+            state.push_move(m)
+            # só quietas tardias são candidatas a poda/redução; xeque é conferido só para elas
+            late_quiet = quiet and i > 0 and not checked and not in_check(state)
+            if futile and late_quiet:
+                state.pop_move()
+                if static_eval + FUTILITY_MARGIN[depth] > best_score:
+                    best_score = static_eval + FUTILITY_MARGIN[depth]
+                continue
+            if i == 0:
+                score = -self.alphabeta(state, depth-1, -beta, -alpha)
+            else:
+                # PVS: as demais jogadas são provadas com janela nula. LMR: quietas tardias ainda
+                # vão com profundidade menor; se passarem de alpha, repete com a profundidade cheia
+                full = True
+                if (self.lmr and late_quiet and depth >= LMR_MIN_DEPTH and i >= LMR_MIN_MOVES
+                        and m not in killers):
+                    reduction = 1 if i < 6 else 2
+                    score = -self.alphabeta(state, depth - 1 - reduction, -alpha - 1, -alpha)
+                    full = score > alpha
+                if full:
+                    score = -self.alphabeta(state, depth-1, -alpha-1, -alpha)
+                    # passou de alpha sem chegar em beta: nova PV, busca com a janela inteira
+                    if alpha < score < beta:
+                        score = -self.alphabeta(state, depth-1, -beta, -alpha)
+            state.pop_move()
+            if score > best_score:
+                best_score = score
+                best_move = m
+            if score > alpha:
+                alpha = score
             if alpha >= beta:
-                return e_score
-    if depth == 0:
-        return quiescence(self, state, alpha, beta)
-    moves = generate_pseudo_legal_moves(state)
-    moves = filter_legal_moves(state, moves)
-    if not moves:
-        # checkmate or stalemate
-        # find our king
-        king = 'K' if state.active_color == 'w' else 'k'
-        king_sq = None
-        for i,p in enumerate(state.board):
-            if p == king:
-                king_sq = i; break
-        if king_sq is None or is_square_attacked(state, king_sq, 'b' if state.active_color=='w' else 'w'):
-            return -INF + (100 - depth)  # checkmate: bad
-        else:
-            return 0  # stalemate
-    moves = self.order_moves(state, moves)
-    best_score = -INF
-    best_move = None
-    alpha_orig = alpha  # Adicionada esta linha para definir alpha_orig
-    for m in moves:
-        state.push_move(m)
-        score = -self.alphabeta(state, depth-1, -beta, -alpha)
-        state.pop_move()
-        if self.time_exceeded():
-            return 0
-        if score > best_score:
-            best_score = score
-            best_move = m
-        if score > alpha:
-            alpha = score
-        if alpha >= beta:
-            break
-    # store in TT
-    flag = 'EXACT'
-    if best_score <= alpha_orig:  # Agora alpha_orig está definido
-        flag = 'UPPER'
-    if best_score >= beta:
-        flag = 'LOWER'
-    self.tt[zob] = (depth, best_score, flag, best_move)
-    return best_score
+                self.cutoffs += 1
+                if i == 0:
+                    self.first_cutoffs += 1
+                if quiet:
+                    self.update_quiet_cutoff(state, m, depth, quiets_tried)
+                break
+            if quiet:
+                quiets_tried.append(m)
+        if i < 0:
+            # no legal moves: checkmate or stalemate
+            if in_check(state):
+                return -INF + ply  # checkmate: quanto mais perto da raiz, pior
+            else:
+                return 0  # stalemate
+        # store in TT
+        flag = TT_EXACT
+        if best_score <= alpha_orig:  # Agora alpha_orig está definido
+            flag = TT_UPPER
+            best_move = None   # em fail-low a "melhor" jogada é só a primeira que não piorou alpha
+        if best_score >= beta:
+            flag = TT_LOWER
+        self.tt.store(zob, depth, score_to_tt(best_score, ply), flag, best_move or 0)
+        return best_score
+
+DELTA_MARGIN = 200   # folga da delta pruning: captura que nem com isso alcança alpha é descartada
 
 def quiescence(searcher: Searcher, state: GameState, alpha, beta):
+    searcher.nodes += 1
+    if searcher.nodes >= searcher.next_poll:
+        searcher.poll()
+    # TT: qualquer entrada serve (profundidade >= 0); quiescence grava com profundidade 0
+    zob = state.current_zobrist
+    ply = state.ply - searcher.root_ply
+    entry = searcher.tt.probe(zob)
+    hash_move = 0
+    if entry is not None:
+        _, e_score, e_flag, hash_move = entry
+        e_score = score_from_tt(e_score, ply)
+        if (e_flag == TT_EXACT or (e_flag == TT_LOWER and e_score >= beta)
+                or (e_flag == TT_UPPER and e_score <= alpha)):
+            return e_score
     stand_pat = evaluate(state)
     if stand_pat >= beta:
         return beta
+    alpha_orig = alpha
     if stand_pat > alpha:
         alpha = stand_pat
-    # generate captures only
-    moves = generate_pseudo_legal_moves(state)
-    moves = [m for m in moves if m.captured != '.']
-    moves = filter_legal_moves(state, moves)
-    moves.sort(key=lambda m: abs(PIECE_VALUES.get(m.captured, 0)) - abs(PIECE_VALUES.get(m.piece, 0)), reverse=True)
-    for m in moves:
+    # só capturas e promoções; delta pruning pula as que não alcançam alpha nem ganhando a peça,
+    # e a SEE as que perdem material na troca
+    board = state.board
+    scored = []
+    for m in generate_captures(state):
+        captured = board[(m >> 6) & 63]
+        gain = abs(PIECE_VALUES[captured]) if captured != EMPTY else 0
+        flag = m & MOVE_FLAG_MASK
+        if flag == MOVE_PROMOTION:
+            gain += 800
+        elif flag == MOVE_ENPASSANT:
+            gain = 100
+        if stand_pat + gain + DELTA_MARGIN <= alpha:
+            continue
+        score = capture_score(board, m)
+        if needs_see(score, m) and see(state, m) < 0:
+            continue   # a troca perde material: não vale a pena olhar na quiescence
+        scored.append((INF if m == hash_move else score, m))
+    scored.sort(key=lambda x: -x[0])
+    best_move = 0
+    for _, m in scored:
         state.push_move(m)
         score = -quiescence(searcher, state, -beta, -alpha)
         state.pop_move()
         if score >= beta:
+            searcher.tt.store(zob, TT_QS_DEPTH, score_to_tt(beta, ply), TT_LOWER, m)
             return beta
         if score > alpha:
             alpha = score
+            best_move = m
+    searcher.tt.store(zob, TT_QS_DEPTH, score_to_tt(alpha, ply), TT_EXACT if alpha > alpha_orig else TT_UPPER,
+                      best_move)
     return alpha
 
+# ----------------------------
+# Perft e comparação de backends
+# ----------------------------
+# Posições de referência (chessprogramming.org/Perft_Results): nome, FEN, {profundidade: folhas}
+PERFT_POSITIONS = [
+    ("start", START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+]
+
+class PerftHash:
+    """Tabela de subtotais do perft: (zobrist, profundidade) -> folhas, tamanho fixo, sempre substitui."""
+
+    def __init__(self, size_mb=16):
+        entries = max(1, size_mb * 1024 * 1024 // 16)
+        entries = 1 << (entries.bit_length() - 1)
+        self.mask = entries - 1
+        self.keys = array('Q', bytes(8 * entries))
+        self.counts = array('Q', bytes(8 * entries))
+        self.hits = 0
+
+    @staticmethod
+    def _key(zobrist, depth):
+        # a profundidade entra na chave: a mesma posição aparece com várias profundidades restantes
+        return zobrist ^ ((depth * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF)
+
+    def get(self, zobrist, depth):
+        key = self._key(zobrist, depth)
+        i = key & self.mask
+        if self.keys[i] == key:
+            self.hits += 1
+            return self.counts[i]
+        return None
+
+    def put(self, zobrist, depth, count):
+        key = self._key(zobrist, depth)
+        i = key & self.mask
+        self.keys[i] = key
+        self.counts[i] = count
+
+def perft(state, depth, verify_hash=False, table=None, pseudo=False):
+    """Conta as folhas da árvore de jogadas legais até depth (valida e mede o gerador).
+
+    Na profundidade 1 as folhas são contadas em bloco (len da lista, sem push/pop). table (um
+    PerftHash) reaproveita subárvores já contadas. pseudo=True gera com
+    generate_pseudo_legal_moves + filter_legal_moves em vez do gerador legal direto, para
+    conferir um contra o outro. verify_hash=True é o modo de depuração: confere a chave zobrist
+    incremental contra compute_zobrist() depois de cada push_move e pop_move (sem contagem em bloco).
+    """
+    if depth == 0:
+        return 1
+    if table is not None and depth > 1:
+        cached = table.get(state.current_zobrist, depth)
+        if cached is not None:
+            return cached
+    if pseudo:
+        moves = filter_legal_moves(state, generate_pseudo_legal_moves(state))
+    else:
+        moves = generate_legal_moves(state)
+    if depth == 1 and not verify_hash:
+        return len(moves)
+    nodes = 0
+    for m in moves:
+        state.push_move(m)
+        if verify_hash:
+            check_zobrist(state, m, 'push_move')
+        nodes += perft(state, depth - 1, verify_hash, table, pseudo)
+        state.pop_move()
+        if verify_hash:
+            check_zobrist(state, m, 'pop_move')
+    if table is not None and depth > 1:
+        table.put(state.current_zobrist, depth, nodes)
+    return nodes
+
+def divide(state, depth, table=None, pseudo=False, show=True):
+    """perft separado por jogada da raiz ({uci: folhas}); compara-se com outro motor para achar bugs."""
+    counts = {}
+    if pseudo:
+        moves = filter_legal_moves(state, generate_pseudo_legal_moves(state))
+    else:
+        moves = generate_legal_moves(state)
+    t0 = time.monotonic()
+    for m in moves:
+        state.push_move(m)
+        counts[move_to_uci(m)] = perft(state, depth - 1, table=table, pseudo=pseudo)
+        state.pop_move()
+    elapsed = max(time.monotonic() - t0, 1e-9)
+    if show:
+        for uci in sorted(counts):
+            print(f"{uci}: {counts[uci]}")
+        total = sum(counts.values())
+        print(f"\nMoves: {len(counts)}  Nodes: {total}  {elapsed:.2f}s  {total/elapsed:.0f} nps")
+    return counts
+
+# Perft paralelo: a árvore é cortada em split_depth plies (a fronteira) e cada caminho vira uma
+# tarefa de um ProcessPoolExecutor. O worker recria a posição com FEN + lista de jogadas (estados
+# não são enviados entre processos) e devolve a contagem; a soma por jogada da raiz dá o divide.
+# Com --hash cada worker monta uma PerftHash só (no initializer do pool) e a reusa em todas as
+# suas tarefas: a chave inclui a posição inteira, então acertos entre subárvores continuam valendo.
+_worker_perft_table = None
+
+def _perft_worker_init(use_hash):
+    global _worker_perft_table
+    _worker_perft_table = PerftHash() if use_hash else None
+
+def _perft_task(task):
+    fen, path, depth, backend = task
+    state = new_state(fen, backend=backend)
+    for text in path:
+        state.push_move(move_from_uci(state, text))
+    return path[0], perft(state, depth, table=_worker_perft_table)
+
+def _frontier(state, split_depth, path=()):
+    # caminhos de jogadas (uci) até split_depth; caminhos mais curtos quando a partida acaba antes
+    if split_depth == 0:
+        return [path]
+    paths = []
+    for m in generate_legal_moves(state):
+        state.push_move(m)
+        paths.extend(_frontier(state, split_depth - 1, path + (move_to_uci(m),)))
+        state.pop_move()
+    return [p for p in paths if p] if path == () else (paths or [path])
+
+def parallel_divide(fen=START_FEN, depth=5, workers=None, backend='mailbox', split_depth=1,
+                    use_hash=False, show=True):
+    """divide() com as subárvores contadas em workers processos ({uci da raiz: folhas})."""
+    workers = workers or os.cpu_count() or 1
+    split_depth = max(1, min(split_depth, depth - 1))
+    state = new_state(fen, backend=backend)
+    tasks = [(fen, path, depth - len(path), backend) for path in _frontier(state, split_depth)]
+    counts = {}
+    t0 = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_perft_worker_init,
+                             initargs=(use_hash,)) as pool:
+        for root, nodes in pool.map(_perft_task, tasks, chunksize=1):
+            counts[root] = counts.get(root, 0) + nodes
+    elapsed = max(time.monotonic() - t0, 1e-9)
+    if show:
+        for uci in sorted(counts):
+            print(f"{uci}: {counts[uci]}")
+        total = sum(counts.values())
+        print(f"\nMoves: {len(counts)}  Nodes: {total}  {elapsed:.2f}s  {total/elapsed:.0f} nps"
+              f"  ({workers} workers, {len(tasks)} tasks)")
+    return counts
+
+def parallel_perft(fen=START_FEN, depth=5, workers=None, backend='mailbox', split_depth=1,
+                   use_hash=False):
+    return sum(parallel_divide(fen, depth, workers, backend, split_depth, use_hash, show=False).values())
+
+def perft_scaling(fen=START_FEN, depth=5, core_counts=(1, 2, 4, 8), backend='mailbox', split_depth=2):
+    """Tempo do perft paralelo para cada número de workers: speedup e eficiência sobre 1 worker."""
+    print(f"CPUs disponíveis: {os.cpu_count()}")
+    base = None
+    for n in core_counts:
+        t0 = time.monotonic()
+        nodes = parallel_perft(fen, depth, n, backend, split_depth)
+        elapsed = max(time.monotonic() - t0, 1e-9)
+        base = base or elapsed
+        speedup = base / elapsed
+        print(f"{n:2} workers: {nodes} nodes  {elapsed:6.2f}s  {nodes/elapsed:>9.0f} nps"
+              f"  speedup {speedup:4.2f}x  efficiency {speedup / n:4.0%}")
+
+def perft_suite(max_depth=4, backend='mailbox', use_hash=False, pseudo=False):
+    """Roda PERFT_POSITIONS até max_depth, confere com os valores de referência e mede nós/s."""
+    total = 0
+    failures = 0
+    t_all = time.monotonic()
+    for name, fen, expected in PERFT_POSITIONS:
+        for depth in sorted(expected):
+            if depth > max_depth:
+                break
+            state = new_state(fen, backend=backend)
+            table = PerftHash() if use_hash else None
+            t0 = time.monotonic()
+            nodes = perft(state, depth, table=table, pseudo=pseudo)
+            elapsed = max(time.monotonic() - t0, 1e-9)
+            ok = nodes == expected[depth]
+            failures += not ok
+            total += nodes
+            status = 'OK' if ok else f'FAIL (expected {expected[depth]})'
+            print(f"{name:10} perft({depth}) = {nodes:>9}  {elapsed:6.2f}s  {nodes/elapsed:>9.0f} nps  {status}")
+    elapsed = max(time.monotonic() - t_all, 1e-9)
+    print(f"Perft [{backend}{', hash' if use_hash else ''}{', pseudo' if pseudo else ''}]: "
+          f"{total} nodes  {elapsed:.2f}s  {total/elapsed:.0f} nps  {failures} failures")
+    return failures == 0
+
+def check_zobrist(state, move, where):
+    expected = state.compute_zobrist()
+    if state.current_zobrist != expected:
+        fen = state.fen()
+        raise RuntimeError(f"zobrist incremental divergiu após {where} "
+                           f"{move_to_uci(move)} em {fen}: "
+                           f"{state.current_zobrist:016x} != {expected:016x}")
+
+def compare_backends(fen=START_FEN, depth=3, search_depth=3):
+    """Roda perft e uma busca de profundidade fixa em cada backend e imprime nós e nós/segundo."""
+    for name in BACKENDS:
+        state = new_state(fen, backend=name)
+        t0 = time.monotonic()
+        nodes = perft(state, depth)
+        elapsed = max(time.monotonic() - t0, 1e-9)
+        print(f"{name:8} perft({depth}) = {nodes}  {elapsed:.2f}s  {nodes/elapsed:.0f} nps")
+        searcher = Searcher()
+        t0 = time.monotonic()
+        move, score = searcher.search(state, max_depth=search_depth, time_limit=None)
+        elapsed = max(time.monotonic() - t0, 1e-9)
+        best = move_to_uci(move) if move else '-'
+        print(f"{name:8} search depth {search_depth}: {best} score {score}  {elapsed:.2f}s")
+
+# ----------------------------
+# Bench
+# ----------------------------
+# Posições fixas para medir desempenho: a busca de profundidade fixa é determinística, então o
+# total de nós é uma assinatura da build (muda se e só se a busca mudou) e nós/s mede a velocidade.
+BENCH_FENS = [
+    START_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+]
+BENCH_DEPTH = 5
+
+def bench(depth=BENCH_DEPTH, backend='mailbox'):
+    """Busca de profundidade fixa em BENCH_FENS; imprime nós por posição, o total e nós/s."""
+    total = 0
+    t0 = time.monotonic()
+    for fen in BENCH_FENS:
+        state = new_state(fen, backend=backend)
+        searcher = Searcher()
+        move, score = searcher.search_fixed(state, depth=depth)
+        total += searcher.nodes
+        print(f"{move_to_uci(move)} {score:>6}  {searcher.nodes:>8} nodes  {fen}")
+    elapsed = max(time.monotonic() - t0, 1e-9)
+    print(f"Bench [{backend}] depth {depth}: {total} nodes  {elapsed:.2f}s  {total/elapsed:.0f} nps")
+    return total
+
+# ----------------------------
+# Lazy SMP
+# ----------------------------
+# N processos buscam a mesma raiz, cada um com seu Searcher, e só se comunicam pela TT
+# compartilhada. Os helpers ímpares pulam profundidades, então preenchem a TT à frente do
+# principal. O primeiro que terminar manda todos pararem; vale o resultado mais profundo.
+def _smp_worker(shm_name, size_mb, age, fen, backend, max_depth, time_limit, node_limit, helper,
+                stop_event, results):
+    searcher = Searcher(hash_mb=0)
+    searcher.tt = SharedTranspositionTable(size_mb, shm_name)
+    searcher.tt.age = age
+    searcher.helper = helper
+    searcher.stop_event = stop_event
+    result = (helper, 0, -INF, None, 0, [])
+    try:
+        state = new_state(fen, backend=backend)
+        move, score = searcher.search(state, max_depth=max_depth, time_limit=time_limit,
+                                      node_limit=node_limit)
+        result = (helper, searcher.depth_reached, score, move and move_to_uci(move),
+                  searcher.nodes, [move_to_uci(m) for m in searcher.best_line])
+    finally:
+        searcher.tt.close()
+        results.put(result)
+
+class LazySMP:
+    """Mesma interface de busca do Searcher (search -> (jogada, score)) com workers processos."""
+    def __init__(self, workers=None, hash_mb=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.tt = SharedTranspositionTable(hash_mb)
+        self.nodes = 0
+        self.depth_reached = 0
+        self.best_line = []
+        self.stop_event = multiprocessing.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def reset(self):
+        self.tt.clear()
+
+    def close(self):
+        self.tt.close()
+
+    def search(self, state: GameState, max_depth=4, time_limit=2.0, node_limit=None):
+        backend = 'bitboard' if isinstance(state, BitboardState) else 'mailbox'
+        self.stop_event.clear()
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(
+                    target=_smp_worker, daemon=True,
+                    args=(self.tt.shm.name, self.tt.size_mb, self.tt.age, state.fen(), backend, max_depth,
+                          time_limit, node_limit, i, self.stop_event, results))
+                 for i in range(self.workers)]
+        for proc in procs:
+            proc.start()
+        done = []
+        for _ in procs:
+            done.append(results.get())
+            self.stop_event.set()   # um terminou (profundidade máxima ou limite): os outros param
+        for proc in procs:
+            proc.join()
+        self.tt.new_search()        # os workers avançaram a geração uma vez; acompanha
+        helper, depth, score, uci, _, line = max(done, key=lambda r: (r[1], r[3] is not None, -r[0]))
+        self.nodes = sum(r[4] for r in done)
+        self.depth_reached = depth
+        move = uci and move_from_uci(state, uci)
+        if move is None:
+            return None, -INF
+        self.best_line = []
+        for text in line:
+            m = move_from_uci(state, text)
+            if m is None:
+                break
+            self.best_line.append(m)
+            state.push_move(m)
+        for _ in self.best_line:
+            state.pop_move()
+        return move, score
+
+def smp_scaling(depth=BENCH_DEPTH, core_counts=(1, 2, 4, 8), backend='mailbox'):
+    """Tempo até a profundidade nas posições do bench, para cada número de workers."""
+    print(f"CPUs disponíveis: {os.cpu_count()}")
+    base = None
+    for n in core_counts:
+        smp = LazySMP(n)
+        nodes = 0
+        t0 = time.monotonic()
+        for fen in BENCH_FENS:
+            smp.reset()
+            smp.search(new_state(fen, backend=backend), max_depth=depth, time_limit=None)
+            nodes += smp.nodes
+        elapsed = max(time.monotonic() - t0, 1e-9)
+        smp.close()
+        base = base or elapsed
+        print(f"{n:2} workers: depth {depth}  {elapsed:6.2f}s  {nodes:>8} nodes  {nodes/elapsed:>7.0f} nps"
+              f"  speedup {base/elapsed:4.2f}x")
+
+def play_game(white, black, fen=START_FEN, time_per_move=0.5, max_plies=160, backend='mailbox'):
+    """Partida entre dois buscadores: 1 (brancas vencem), 0 (pretas) ou 0.5."""
+    state = new_state(fen, backend=backend)
+    for _ in range(max_plies):
+        if state.halfmove >= 100:
+            return 0.5
+        searcher = white if state.active_color == 'w' else black
+        m, _ = searcher.search(state, max_depth=MAX_PLY, time_limit=time_per_move)
+        if m is None:
+            if not in_check(state):
+                return 0.5
+            return 0.0 if state.active_color == 'w' else 1.0
+        state.push_move(m)
+    return 0.5   # adjudicada: sem detecção de repetição, partidas longas viram empate
+
+def elo_diff(score):
+    score = min(max(score, 0.01), 0.99)
+    return 400 * math.log10(score / (1 - score))
+
+def smp_elo(core_counts=(2, 4, 8), games=8, time_per_move=0.5, backend='mailbox'):
+    """Elo com tempo fixo por jogada: N workers contra 1, cores alternadas nas aberturas do bench."""
+    print(f"CPUs disponíveis: {os.cpu_count()}")
+    for n in core_counts:
+        smp, single = LazySMP(n), LazySMP(1)
+        points = 0.0
+        for g in range(games):
+            fen = BENCH_FENS[(g // 2) % len(BENCH_FENS)]
+            if g % 2 == 0:
+                points += play_game(smp, single, fen, time_per_move, backend=backend)
+            else:
+                points += 1 - play_game(single, smp, fen, time_per_move, backend=backend)
+        smp.close()
+        single.close()
+        score = points / games
+        print(f"{n:2} workers vs 1: {points}/{games}  ({score:.0%})  Elo {elo_diff(score):+.0f}")
+
 # ----------------------------
 # CLI e Notação
 # ----------------------------
@@ -798,32 +2884,24 @@ def parse_move_input(s, state):
         ch = s[4].lower()
         if ch in 'qrbn':
             promotion = ch.upper() if state.active_color == 'w' else ch
-    # validate move among legal moves
-    candidates = generate_pseudo_legal_moves(state)
-    candidates = filter_legal_moves(state, candidates)
-    for m in candidates:
-        if m.from_sq == from_sq and m.to_sq == to_sq:
-            # promotion acceptance
-            if m.promotion:
-                if promotion:
-                    # match promotion piece
-                    if m.promotion.lower() == promotion.lower():
-                        return m
-                    else:
-                        continue
-                else:
-                    # if move requires promotion but user didn't supply, default to queen
-                    default_prom = 'Q' if state.active_color == 'w' else 'q'
-                    return state.make_move_struct(from_sq, to_sq, promotion=default_prom)
-            else:
-                return m
+    # validate move among legal moves: monta o Move da CLI e converte para o int do gerador
+    candidates = generate_legal_moves(state)
+    move = move_from_struct(state.make_move_struct(from_sq, to_sq, promotion=promotion))
+    if move in candidates:
+        return move
+    if promotion is None:
+        # if move requires promotion but user didn't supply, default to queen
+        default_prom = 'Q' if state.active_color == 'w' else 'q'
+        move = move_from_struct(state.make_move_struct(from_sq, to_sq, promotion=default_prom))
+        if move in candidates:
+            return move
     return None
 
 # ----------------------------
 # Main Play Loop
 # ----------------------------
-def human_vs_engine():
-    state = GameState()
+def human_vs_engine(backend='mailbox'):
+    state = new_state(backend=backend)
     searcher = Searcher()
     while True:
         state.print_board()
@@ -844,12 +2922,13 @@ def human_vs_engine():
             if m is None:
                 print("No move found.")
                 continue
-            print("Engine plays:", idx_to_sq(m.from_sq) + idx_to_sq(m.to_sq))
+            print("Engine plays:", move_to_uci(m))
             state.push_move(m)
             continue
         if user == 'flip':
             # debug: flip colors
             state.active_color = 'b' if state.active_color == 'w' else 'w'
+            state.current_zobrist = state.compute_zobrist()
             continue
         # try parse as move
         move = parse_move_input(user, state)
@@ -860,37 +2939,477 @@ def human_vs_engine():
         else:
             print("Jogada inválida. Use notação 'e2e4' ou 'g1f3'. Comando 'undo', 'engine', 'quit'.")
 
-def engine_vs_engine(depth=3, time_per_move=1.0, moves=50):
-    state = GameState()
+def start_ponder(searcher, state, expected, depth, time_per_move):
+    """Busca em thread a posição depois da resposta esperada; o resultado vai para job[2]."""
+    board = new_state(state.fen(), backend='bitboard' if isinstance(state, BitboardState) else 'mailbox')
+    board.push_move(expected)
+    result = [None, -INF]
+    def run():
+        result[:] = searcher.search(board, max_depth=depth, time_limit=time_per_move, ponder=True)
+    searcher.started.clear()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    searcher.started.wait()
+    return thread, expected, result
+
+def finish_ponder(searcher, job, state):
+    """O adversário jogou: num acerto devolve [jogada, score] do ponder; numa falha para a
+    busca (se ainda estiver rodando) e devolve None."""
+    thread, expected, result = job
+    if state.last_move() == expected:
+        searcher.ponderhit()
+        thread.join()
+        return result
+    if thread.is_alive():
+        searcher.stop()
+    thread.join()
+    return None
+
+def check_ponder_miss(depth=3, backend='mailbox'):
+    """Regressão: depois de um ponder que já tinha terminado e errou a resposta, a busca normal
+    ainda chega à profundidade pedida."""
+    state = new_state(backend=backend)
+    searcher = Searcher()
+    m, _ = searcher.search(state, max_depth=depth, time_limit=None)
+    expected = searcher.best_line[1]
+    state.push_move(m)
+    job = start_ponder(searcher, state, expected, depth, None)
+    job[0].join()   # o ponder acaba antes de o adversário jogar
+    state.push_move(next(x for x in generate_legal_moves(state) if x != expected))
+    ok = finish_ponder(searcher, job, state) is None
+    searcher.search(state, max_depth=depth, time_limit=None)
+    ok = ok and searcher.depth_reached == depth
+    print(f"ponder miss: depth {searcher.depth_reached}/{depth}  {'OK' if ok else 'FAIL'}")
+    return ok
+
+def engine_vs_engine(depth=3, time_per_move=1.0, moves=50, backend='mailbox', ponder=False):
+    # ponder: quem acabou de jogar busca a resposta esperada enquanto o outro pensa. As duas
+    # buscas dividem o GIL neste processo; o ganho real é com processos separados (UCI)
+    state = new_state(backend=backend)
     s1 = Searcher()
     s2 = Searcher()
+    pondering = {}   # buscador -> (thread, jogada esperada do adversário, [jogada, score])
     for ply in range(moves):
         state.print_board()
         print(f"Move {ply+1}, side {state.active_color}")
         searcher = s1 if state.active_color == 'w' else s2
-        m, score = searcher.search(state, max_depth=depth, time_limit=time_per_move)
+        t0 = time.monotonic()
+        m = None
+        job = pondering.pop(searcher, None)
+        if job is not None:
+            result = finish_ponder(searcher, job, state)
+            if result is not None:
+                m, score = result
+                print("Ponder hit")
+        if m is None:
+            m, score = searcher.search(state, max_depth=depth, time_limit=time_per_move)
         if m is None:
             print("No move found, game over.")
             break
-        print("Engine plays:", idx_to_sq(m.from_sq) + idx_to_sq(m.to_sq), "score", score)
+        print("Engine plays:", move_to_uci(m), "score", score, f"({time.monotonic() - t0:.2f}s)")
+        tt = searcher.tt.stats()
+        print(f"TT: hits {tt['hits']}/{tt['probes']}  collisions {tt['collisions']}  hashfull {tt['hashfull']}/1000")
+        print(f"Cutoffs: {searcher.cutoffs}  on first move {searcher.first_cutoff_rate():.0%}")
+        line = searcher.best_line
         state.push_move(m)
+        if ponder and len(line) > 1 and line[0] == m:
+            pondering[searcher] = start_ponder(searcher, state, line[1], depth, time_per_move)
         # small pause
         time.sleep(0.1)
+    for searcher, (thread, _, _) in pondering.items():
+        if thread.is_alive():
+            searcher.stop()
+        thread.join()
     state.print_board()
 
+def perft_cli(args, backend, use_hash, pseudo, workers=None):
+    if args[0] == 'perft' and len(args) > 1 and args[1] == 'suite':
+        ok = perft_suite(int(args[2]) if len(args) > 2 else 4, backend, use_hash, pseudo)
+        sys.exit(0 if ok else 1)
+    if args[0] == 'perft' and len(args) > 1 and args[1] == 'scale':
+        perft_scaling(' '.join(args[3:]) or START_FEN, int(args[2]) if len(args) > 2 else 5,
+                      backend=backend)
+        return
+    depth = int(args[1]) if len(args) > 1 else 4
+    fen = ' '.join(args[2:]) or START_FEN
+    if workers:
+        counts = parallel_divide(fen, depth, workers, backend, use_hash=use_hash, show=args[0] == 'divide')
+        if args[0] == 'perft':
+            print(f"perft({depth}) = {sum(counts.values())}")
+        return
+    state = new_state(fen, backend=backend)
+    table = PerftHash() if use_hash else None
+    if args[0] == 'divide':
+        divide(state, depth, table=table, pseudo=pseudo)
+        return
+    t0 = time.monotonic()
+    nodes = perft(state, depth, table=table, pseudo=pseudo)
+    elapsed = max(time.monotonic() - t0, 1e-9)
+    print(f"perft({depth}) = {nodes}  {elapsed:.2f}s  {nodes/elapsed:.0f} nps")
+
+# ----------------------------
+# Livro de aberturas (Polyglot)
+# ----------------------------
+# Arquivo .bin: entradas de 16 bytes big-endian (chave, jogada, peso, learn) ordenadas pela chave.
+# O arquivo é mapeado com mmap e nada é lido na abertura; cada consulta é uma busca binária que
+# toca só as páginas que visita, então o tamanho do livro não custa nada até ser consultado.
+BOOK_ENTRY = struct.Struct(">QHHI")
+BOOK_KEY = struct.Struct(">Q")
+POLYGLOT_PROMOTIONS = ' nbrq'   # bits 12-14 da jogada
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        # mmap não aceita arquivo vazio: livro vazio é só "nenhuma entrada"
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.size = size // BOOK_ENTRY.size
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def entries(self, key):
+        """[(jogada bruta, peso, learn)] da chave, na ordem do arquivo."""
+        data = self.data
+        lo, hi = 0, self.size
+        while lo < hi:   # primeira entrada com chave >= key
+            mid = (lo + hi) // 2
+            if BOOK_KEY.unpack_from(data, mid * BOOK_ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        while lo < self.size:
+            k, raw, weight, learn = BOOK_ENTRY.unpack_from(data, lo * BOOK_ENTRY.size)
+            if k != key:
+                break
+            found.append((raw, weight, learn))
+            lo += 1
+        return found
+
+    def moves(self, state):
+        """[(jogada, peso)] do livro para a posição; entradas que não são legais aqui são ignoradas."""
+        result = []
+        for raw, weight, _ in self.entries(state.polyglot_key()):
+            m = book_move(state, raw)
+            if m is not None:
+                result.append((m, weight))
+        return result
+
+    def choose(self, state, mode='weighted', rng=random):
+        """Jogada do livro ou None. 'weighted': sorteio proporcional ao peso; 'best': maior peso."""
+        moves = [(m, w) for m, w in self.moves(state) if w > 0]
+        if not moves:
+            return None
+        if mode == 'best':
+            return max(moves, key=lambda mw: mw[1])[0]
+        return rng.choices([m for m, _ in moves], weights=[w for _, w in moves])[0]
+
+def book_move(state, raw):
+    """Jogada Polyglot (casas com a1 = 0, roque como rei captura a torre) -> jogada legal ou None."""
+    to_sq = (raw & 63) ^ 56
+    from_sq = ((raw >> 6) & 63) ^ 56
+    text = idx_to_sq(from_sq) + idx_to_sq(to_sq) + POLYGLOT_PROMOTIONS[(raw >> 12) & 7].strip()
+    if state.board[from_sq] & TYPE_MASK == KING and text in ('e1h1', 'e1a1', 'e8h8', 'e8a8'):
+        text = text[:2] + ('g' if text[2] == 'h' else 'c') + text[3]
+    return move_from_uci(state, text)
+
+def book_cli(args, backend):
+    # python chess_engine.py book <arquivo.bin> [FEN]: lista as jogadas do livro para a posição
+    state = new_state(' '.join(args[2:]) or START_FEN, backend=backend)
+    with OpeningBook(args[1]) as book:
+        moves = book.moves(state)
+        total = sum(w for _, w in moves) or 1
+        print(f"key {state.polyglot_key():016x}  {book.size} entries in book")
+        for m, weight in sorted(moves, key=lambda mw: -mw[1]):
+            print(f"{move_to_uci(m):6} weight {weight:>6}  {weight / total:6.1%}")
+
+# ----------------------------
+# UCI
+# ----------------------------
+# Protocolo para GUIs e gerenciadores de partidas (cutechess, Arena...). A entrada é lida nesta
+# thread; a busca roda numa thread de fundo, então 'stop' chega no meio dela e sai no próximo poll.
+UCI_NAME = "ape_2025_eyder"
+UCI_MOVES_TO_GO = 30       # sem movestogo: supõe que ainda faltam tantas jogadas
+UCI_MOVE_OVERHEAD = 0.05   # s reservados por jogada para a comunicação com a GUI
+
+def uci_score(score):
+    # mate vem como INF - plies da raiz até o mate
+    if abs(score) < MATE_BOUND:
+        return f"cp {score}"
+    plies = INF - abs(score)
+    moves = (plies + 1) // 2
+    return f"mate {moves if score > 0 else -moves}"
+
+def uci_time_limits(state, params):
+    """(time_limit, soft_time) em segundos a partir dos parâmetros de 'go'."""
+    if 'movetime' in params:
+        t = max(params['movetime'] / 1000 - UCI_MOVE_OVERHEAD, 0.01)
+        return t, t
+    left = params.get('wtime' if state.active_color == 'w' else 'btime')
+    if left is None:
+        return None, None
+    inc = params.get('winc' if state.active_color == 'w' else 'binc', 0)
+    left = max(left / 1000 - UCI_MOVE_OVERHEAD, 0.01)
+    soft = left / params.get('movestogo', UCI_MOVES_TO_GO) + inc / 1000 * 3 / 4
+    return min(soft * 4, left / 2), min(soft, left / 2)
+
+class UCIEngine:
+    def __init__(self, backend='mailbox', out=None):
+        self.backend = backend
+        self.out = out or sys.stdout
+        self.searcher = Searcher()
+        self.searcher.on_iteration = self.report
+        self.state = new_state(backend=backend)
+        self.fen = START_FEN
+        self.moves = []           # jogadas (uci) aplicadas sobre self.fen em self.state
+        self.thread = None
+        self.book = None          # OpeningBook (setoption BookFile); consultado antes de buscar
+        self.book_mode = 'weighted'
+        self.infinite = False
+        self.stop_event = threading.Event()   # libera o bestmove de 'go infinite'
+        self.lock = threading.Lock()
+
+    def send(self, line):
+        with self.lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def report(self, searcher, depth, score):
+        elapsed = max(searcher.elapsed(), 1e-9)
+        pv = ' '.join(move_to_uci(m) for m in searcher.best_line)
+        self.send(f"info depth {depth} score {uci_score(score)} nodes {searcher.nodes} "
+                  f"nps {int(searcher.nodes / elapsed)} time {int(elapsed * 1000)} "
+                  f"hashfull {searcher.tt.hashfull()} pv {pv}")
+
+    def loop(self, lines=None):
+        for line in lines or sys.stdin:
+            if not self.command(line.strip()):
+                break
+        self.stop()
+        self.wait()
+
+    def command(self, line):
+        """Executa uma linha do protocolo; False em 'quit'."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        cmd = tokens[0]
+        if cmd == 'uci':
+            self.send(f"id name {UCI_NAME}")
+            self.send("id author eddieJPNG")
+            self.send(f"option name Hash type spin default {self.searcher.tt.size_mb} min 1 max 1024")
+            self.send("option name Ponder type check default false")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name BookMode type combo default weighted var weighted var best")
+            self.send("uciok")
+        elif cmd == 'isready':
+            self.send("readyok")
+        elif cmd == 'setoption':
+            self.set_option(tokens[1:])
+        elif cmd == 'ucinewgame':
+            self.wait()
+            self.searcher.reset()
+            self.set_position(START_FEN, [])
+        elif cmd == 'position':
+            self.wait()
+            self.position(tokens[1:])
+        elif cmd == 'go':
+            self.wait()
+            self.go(tokens[1:])
+        elif cmd == 'ponderhit':
+            self.searcher.ponderhit()
+            self.stop_event.set()
+        elif cmd == 'stop':
+            self.stop()
+        elif cmd == 'quit':
+            self.stop()
+            return False
+        elif cmd == 'd':
+            self.state.print_board()   # extensão comum (Stockfish): mostra a posição
+        return True
+
+    def set_option(self, tokens):
+        # setoption name <nome> value <valor>
+        if 'name' not in tokens:
+            return
+        if self.thread is not None and self.thread.is_alive():
+            # o protocolo só permite setoption com o motor parado (a busca está lendo a TT):
+            # depois de um 'stop' espera o bestmove; com a busca ainda rodando, ignora
+            if not self.stop_event.is_set():
+                self.send("info string setoption ignored while searching")
+                return
+            self.wait()
+        rest = tokens[tokens.index('name') + 1:]
+        name = ' '.join(rest[:rest.index('value')] if 'value' in rest else rest).lower()
+        value = rest[rest.index('value') + 1:] if 'value' in rest else []
+        if name == 'hash' and value:
+            self.searcher.tt.resize(max(1, int(value[0])))
+        elif name == 'bookfile':
+            if self.book is not None:
+                self.book.close()
+                self.book = None
+            path = ' '.join(value)
+            if path and path != '<empty>':
+                try:
+                    self.book = OpeningBook(path)
+                except OSError as e:
+                    self.send(f"info string cannot open book {path}: {e}")
+        elif name == 'bookmode' and value and value[0] in ('weighted', 'best'):
+            self.book_mode = value[0]
+
+    def position(self, tokens):
+        if not tokens:
+            return
+        moves = tokens[tokens.index('moves') + 1:] if 'moves' in tokens else []
+        if tokens[0] == 'startpos':
+            fen = START_FEN
+        elif tokens[0] == 'fen':
+            end = tokens.index('moves') if 'moves' in tokens else len(tokens)
+            fen = ' '.join(tokens[1:end])
+        else:
+            return
+        self.set_position(fen, moves)
+
+    def set_position(self, fen, moves):
+        # mesma posição inicial: desfaz só até o prefixo comum e aplica o resto, em vez de
+        # refazer a partida toda (a GUI manda a lista inteira a cada jogada)
+        if fen != self.fen:
+            self.state = new_state(fen, backend=self.backend)
+            self.fen, self.moves = fen, []
+        common = 0
+        while common < min(len(moves), len(self.moves)) and moves[common] == self.moves[common]:
+            common += 1
+        for _ in range(len(self.moves) - common):
+            self.state.pop_move()
+        del self.moves[common:]
+        for text in moves[common:]:
+            m = move_from_uci(self.state, text)
+            if m is None:
+                self.send(f"info string illegal move {text}")
+                break
+            self.state.push_move(m)
+            self.moves.append(text)
+
+    def go(self, tokens):
+        params = {}
+        for i, tok in enumerate(tokens):
+            if tok in ('depth', 'nodes', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo') \
+                    and i + 1 < len(tokens):
+                params[tok] = int(tokens[i + 1])
+        self.infinite = 'infinite' in tokens
+        if self.book is not None and not self.infinite and 'ponder' not in tokens:
+            m = self.book.choose(self.state, self.book_mode)
+            if m is not None:
+                self.send(f"bestmove {move_to_uci(m)}")
+                return
+        time_limit, soft_time = (None, None) if self.infinite else uci_time_limits(self.state, params)
+        max_depth = params.get('depth', MAX_PLY)
+        # go ponder: a posição já inclui a jogada esperada do adversário; o relógio só começa a
+        # contar no 'ponderhit' (e com 'stop' a GUI descarta o bestmove e manda a posição real)
+        ponder = 'ponder' in tokens
+        self.stop_event.clear()
+        self.searcher.started.clear()
+        self.thread = threading.Thread(target=self.think, daemon=True,
+                                       args=(max_depth, time_limit, soft_time, params.get('nodes'), ponder))
+        self.thread.start()
+        self.searcher.started.wait()   # 'stop'/'ponderhit' lidos daqui em diante valem para esta busca
+
+    def think(self, max_depth, time_limit, soft_time, node_limit, ponder):
+        move, _ = self.searcher.search(self.state, max_depth=max_depth, time_limit=time_limit,
+                                       node_limit=node_limit, soft_time=soft_time, ponder=ponder)
+        if self.infinite or self.searcher.pondering:
+            self.stop_event.wait()   # em 'go infinite'/ponder o bestmove só sai depois de stop/ponderhit
+        self.searcher.pondering = False
+        line = self.searcher.best_line
+        if move is None:
+            # sem jogadas legais: mate 0 para quem levou mate, cp 0 no afogamento
+            self.send(f"info depth 0 score {'mate 0' if in_check(self.state) else 'cp 0'}")
+            self.send("bestmove 0000")
+        elif len(line) > 1 and line[0] == move:
+            self.send(f"bestmove {move_to_uci(move)} ponder {move_to_uci(line[1])}")
+        else:
+            self.send(f"bestmove {move_to_uci(move)}")
+
+    def stop(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.searcher.stop()
+            self.stop_event.set()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+def uci(backend='mailbox'):
+    UCIEngine(backend).loop()
+
 def main():
-    print("Python Chess Engine (CLI)")
-    print("Commands: 'play' (human vs engine), 'engine' (engine vs engine), 'quit'")
+    # backend de representação: python chess_engine.py --bitboard
+    backend = 'bitboard' if '--bitboard' in sys.argv[1:] else 'mailbox'
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if args and args[0] == 'bench':
+        # python chess_engine.py bench [profundidade]
+        bench(int(args[1]) if len(args) > 1 else BENCH_DEPTH, backend)
+        return
+    if args and args[0] == 'book' and len(args) > 1:
+        book_cli(args, backend)
+        return
+    if args and args[0] == 'check':
+        # python chess_engine.py check   (regressões rápidas da busca)
+        sys.exit(0 if check_ponder_miss() else 1)
+    if args and args[0] == 'uci':
+        # python chess_engine.py uci   (protocolo UCI em stdin/stdout)
+        uci(backend)
+        return
+    if args and args[0] == 'smp':
+        # python chess_engine.py smp [profundidade]        tempo até a profundidade, 1/2/4/8 workers
+        #                        smp elo [partidas] [s/jogada]  N workers contra 1 a tempo fixo
+        if len(args) > 1 and args[1] == 'elo':
+            smp_elo(games=int(args[2]) if len(args) > 2 else 8,
+                    time_per_move=float(args[3]) if len(args) > 3 else 0.5, backend=backend)
+        else:
+            smp_scaling(int(args[1]) if len(args) > 1 else BENCH_DEPTH, backend=backend)
+        return
+    if args and args[0] in ('perft', 'divide'):
+        # python chess_engine.py perft suite [prof_max] | perft <prof> [FEN] | divide <prof> [FEN]
+        #                        perft scale <prof> [FEN] (escala 1/2/4/8 workers)
+        # opções: --bitboard, --hash (PerftHash), --pseudo (pseudo-legal + filtro), --workers=N
+        workers = [int(a.split('=', 1)[1]) for a in sys.argv[1:] if a.startswith('--workers=')]
+        perft_cli(args, backend, '--hash' in sys.argv[1:], '--pseudo' in sys.argv[1:],
+                  workers[-1] if workers else None)
+        return
+    print("Python Chess Engine (CLI)", f"[{backend}]")
+    print("Commands: 'play' (human vs engine), 'engine' (engine vs engine), 'compare' (perft mailbox x bitboard), 'bench', 'quit'")
     while True:
         cmd = input(">")
         if cmd.strip() == 'quit':
             break
         elif cmd.strip() == 'play':
-            human_vs_engine()
+            human_vs_engine(backend)
         elif cmd.strip() == 'engine':
-            engine_vs_engine()
+            engine_vs_engine(backend=backend, ponder="--ponder" in sys.argv[1:])
+        elif cmd.strip() == 'compare':
+            compare_backends()
+        elif cmd.strip() == 'bench':
+            bench(backend=backend)
+        elif cmd.strip() == 'uci':
+            # GUIs que abrem o programa sem argumentos mandam 'uci' primeiro
+            uci_engine = UCIEngine(backend)
+            uci_engine.command('uci')
+            uci_engine.loop()
+            break
         else:
-            print("Comando inválido. Use 'play', 'engine', ou 'quit'.")
+            print("Comando inválido. Use 'play', 'engine', 'compare', 'bench', ou 'quit'.")
 
 if __name__ == "__main__":
     try: